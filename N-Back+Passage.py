@@ -1,8 +1,16 @@
-from psychopy import visual, core, event, gui, sound
-import pandas as pd
+from psychopy import visual, core, event, gui, sound, logging
 import random
 import os
 from datetime import datetime
+from item_bank import ItemBank, shuffle_options, question_text
+from self_paced import measure_font, build_page, make_word_window, draw_word
+from nback import generate_targets, generate_stim_list, is_target, correct_response, score_response
+from realtime import RealtimeMode
+from export import BackgroundWriter
+from calibration import load_profile, profile_id, frames_for, frame_locked, correct_rt
+from records import TrialStore, nback_fields, passage_fields
+from markers import MarkerSender
+from timeline import load_timeline, compile_timeline
 
 
 # === PARTICIPANT INFO ===
@@ -17,13 +25,34 @@ data_folder = 'data/'
 os.makedirs(data_folder, exist_ok=True)
 current_date = datetime.now().strftime("%Y-%m-%d")
 
+# Data files are written on a background thread (see export.py)
+writer = BackgroundWriter()
+
 # === LOAD PASSAGES & AUDIO FILES ===
-df = pd.read_excel("passages.xlsx", header=1)
-df.columns = df.columns.str.strip()
-df = df.sample(frac=1).reset_index(drop=True)
+item_bank = ItemBank("passages.xlsx")
+n_passages = 3
+
+# 'page': one screen per Field page, one RT per page
+# 'self_paced': moving-window reading, one RT per word (see self_paced.py)
+reading_mode = 'page'
+self_paced_font = 'Courier New'  # must be monospace
+
+# === HARDWARE CALIBRATION ===
+# Measured once per station with calibration.py; loaded here without measuring
+screen = 0
+calibration = load_profile(screen)
+calibration_id = profile_id(calibration)
 
 # === WINDOW SETTINGS ===
-win = visual.Window(monitor = "testMonitor", fullscr=True, color='grey', units='pix')
+win = visual.Window(monitor = "testMonitor", fullscr=True, color='grey', units='pix', screen=screen, allowStencil=True)
+
+# Without a profile, frame counts use the refresh rate measured now (None if
+# that fails too, in which case durations are waited in time)
+fallback_frame_interval = None
+if calibration is None:
+    measured_rate = win.getActualFrameRate()
+    if measured_rate:
+        fallback_frame_interval = 1 / measured_rate
 
 # ASSIGN CONDITIONS
 ppt_id = int(expInfo['Participant ID'])
@@ -33,10 +62,8 @@ remainder = ppt_id % 4
 ## Passage difficulty 
 if remainder in [1, 3]:
     difficulty = 'easy'
-    field_cols = ['Field1', 'Field2', 'Field3']
 else:
     difficulty = 'difficult'
-    field_cols = ['Field1.1', 'Field2.1', 'Field3.1']
     
 ## N-Back letter vs. audio 
 is_letter_trial = remainder in [1, 2]
@@ -50,6 +77,19 @@ elif remainder == 3:
 else:
     condition = 'audio_difficult'
 
+# === SESSION LOG ===
+session_log = logging.LogFile(f"{data_folder}{ppt_id}-{remainder}-{current_date}_session.log", level=logging.INFO, filemode='w')
+logging.info(f"calibration profile: {calibration_id}")
+if calibration is None:
+    if fallback_frame_interval is None:
+        logging.warning("No calibration profile for this station; run calibration.py. Refresh rate unknown: durations are timed, with no latency correction.")
+    else:
+        logging.warning(f"No calibration profile for this station; run calibration.py. Using the measured {1 / fallback_frame_interval:.1f} Hz and no latency correction.")
+elif list(calibration['resolution']) != [int(v) for v in win.size]:
+    logging.warning(f"Calibrated at {calibration['resolution']} but window is {list(win.size)}; consider recalibrating.")
+if calibration is not None and calibration.get('input_latency_method') == 'not_measured':
+    logging.warning("Keyboard latency was not measured for this station; rt_corrected only removes audio latency.")
+
 # Press 9 to escape study
 def get_response(key_list, timing=False):
     if timing:
@@ -78,8 +118,91 @@ iti_duration = 1.0
 letters = list("CGHKPQTW")
 audio_folder = "audio-alphabet"
 
+# Real-time mode: no automatic GC, raised priority and optional CPU pinning
+# during each timed block (see realtime.py). Off by default.
+realtime_mode = False
+realtime_cpu = None  # e.g. 2 to pin to core 2
+realtime = RealtimeMode(enabled=realtime_mode, cpu=realtime_cpu)
+
+# Event markers for physiological recorders (see markers.py). Off when None.
+marker_address = None  # e.g. ('127.0.0.1', 5005)
+markers = MarkerSender(marker_address, clock=core.getTime)
+
+# Exchange clock offsets with the recorder (between blocks only)
+def sync_markers(label):
+    if not markers.enabled:
+        return
+    result = markers.sync(label)
+    if result is None:
+        logging.warning(f"markers [{label}]: no sync reply from {marker_address}")
+    else:
+        logging.info(f"markers [{label}]: clock offset {result['offset'] * 1000:.3f} ms, round trip {result['rtt'] * 1000:.3f} ms")
+
+# Show stimuli for a fixed number of frames (duration converted with the calibration
+# profile or the measured refresh rate), or for the duration itself if neither is known
+def show_frames(stims, duration):
+    n_frames = frames_for(duration, calibration, fallback_frame_interval)
+    if n_frames is None:
+        for stim in stims:
+            stim.draw()
+        win.flip()
+        core.wait(duration)
+        return
+    for _ in range(n_frames):
+        for stim in stims:
+            stim.draw()
+        win.flip()
+
+# N-back trial records: one preallocated columnar store per section (see records.py)
+def new_nback_store(section, n_trials):
+    constants = {'ppt_ID': ppt_id, 'condition': condition, 'section': section, 'calibration_id': calibration_id}
+    return TrialStore(n_trials, nback_fields, constants)
+
+# Load each letter sound once instead of creating a Sound on every trial
+def load_letter_sounds(audio_folder, letter_list):
+    sounds = {}
+    for letter in set(letter_list):
+        try:
+            sounds[letter] = sound.Sound(os.path.join(audio_folder, f"{letter}.wav"))
+        except Exception as e:
+            print(f"Audio error for {letter}: {e}")
+            sounds[letter] = None
+    return sounds
+
+# === FUNC: Composite screens for training demos ===
+# Static parts of a demo screen are rendered once into a single image, so each
+# flip only draws the composite plus the elements that change (letter, feedback).
+composite_size = (900, 600)  # pix, centred on the screen
+
+def make_composite(win, stims):
+    half_w = min(composite_size[0] / win.size[0], 1)
+    half_h = min(composite_size[1] / win.size[1], 1)
+    return visual.BufferImageStim(win, stim=stims, rect=(-half_w, half_h, half_w, -half_h), pos=(0, 0))
+
+def place_demo_markers(i, demo_sequence, demo_box, match_box, response_highlight, explanation_text, demo_pos_y, demo_spacing):
+    demo_box.pos = (-270 + i * demo_spacing, demo_pos_y)
+    overlays = [demo_box]
+
+    if demo_sequence[i] == '1' and i >= 2:
+        match_box.pos = (-270 + (i - 2) * demo_spacing, demo_pos_y)
+        overlays.append(match_box)
+
+    if demo_sequence[i] == '1':
+        response_highlight.pos = (300, -250)
+        explanation_text.text = "This letter is the same as two steps ago, so the correct answer is 'k'."
+        explanation_text.pos = (180, -180)
+    else:
+        response_highlight.pos = (-300, -250)
+        explanation_text.text = "This letter is different from two steps ago, so the correct answer is 'd'."
+        explanation_text.pos = (-180, -180)
+
+    overlays.extend([response_highlight, explanation_text])
+    return overlays
+
 # === FUNC: N-Back training demo 1 ===
-def run_training_demo_1(is_letter_trial, win, audio_folder, iti_duration, condition):
+# Builds every stimulus, composite screen, sound and record for the demo up
+# front and returns a function that runs it.
+def prepare_training_demo_1(is_letter_trial, win, audio_folder, iti_duration, condition):
     demo_sequence = '0010001101'
     demo_letters = ['G', 'H', 'G', 'P', 'W', 'T', 'W', 'T', 'C', 'T']
 
@@ -106,107 +229,86 @@ def run_training_demo_1(is_letter_trial, win, audio_folder, iti_duration, condit
     bottom_right = visual.TextStim(win, text='K\nMatch', color='white', pos=(300, -250), height=30)
     incorrect_text = visual.TextStim(win, text="Incorrect\nPress 'SPACE' to move on", color='red', height=40, pos=(0, -80))
     explanation_text = visual.TextStim(win, text='', color='white', height=22, wrapWidth=500)
-    
-    responses = []
-    clock = core.Clock()
-    
-    for i, letter in enumerate(demo_letters):
-        correct_resp = 'k' if demo_sequence[i] == '1' else 'd'
-        responded_correctly = False
-        
-        while not responded_correctly:
-            # === ITI Fixation ===
-            fixation.draw()
-            win.flip()
-            core.wait(iti_duration)
-
-            # === DRAW ALL STIMULI ===
-            if is_letter_trial:
-                # Center letter shown visually
-                center_stim.text = letter
-                center_stim.draw()
-            else:
-                # Keep fixation
-                fixation.draw()
 
-                # Play audio
-                letter_file = os.path.join(audio_folder, f"{letter}.wav")
-                snd = sound.Sound(letter_file)
-                snd.play()
+    # === PRE-RENDER COMPOSITE SCREENS ===
+    # Stimulus screen: top row up to the current letter, cues and highlight box.
+    # Feedback screen: nothing on it changes between retries, so it is one image.
+    stim_screens = []
+    feedback_screens = []
+    for i, letter in enumerate(demo_letters):
+        overlays = place_demo_markers(i, demo_sequence, demo_box, match_box, response_highlight, explanation_text, demo_pos_y, demo_spacing)
+        stim_screens.append(make_composite(win, demo_texts[:i+1] + [bottom_left, bottom_right, demo_box]))
+        center_stim.text = letter
+        feedback_screens.append(make_composite(win, demo_texts[:i+1] + [center_stim, bottom_left, bottom_right, incorrect_text] + overlays))
 
-            # Top row (up to current letter)
-            for stim in demo_texts[:i+1]:
-                stim.draw()
+    sounds = {} if is_letter_trial else load_letter_sounds(audio_folder, demo_letters)
 
-            # Response cues
-            bottom_left.draw()
-            bottom_right.draw()
+    # Per-trial records are built up front; the loop only fills in the response
+    responses = new_nback_store('train_1', len(demo_letters))
+    for i, letter in enumerate(demo_letters):
+        responses[i, 'trial'] = i + 1
+        responses[i, 'stim'] = letter
+        responses[i, 'is_target'] = demo_sequence[i] == 1
+    clock = core.Clock()
 
-            # Highlight current letter
-            demo_box.pos = (-270 + i * demo_spacing, demo_pos_y)
-            demo_box.draw()
+    def run():
+        for i, letter in enumerate(demo_letters):
+            correct_resp = 'k' if demo_sequence[i] == '1' else 'd'
+            responded_correctly = False
+            
+            while not responded_correctly:
+                # === ITI Fixation ===
+                show_frames([fixation], iti_duration)
+
+                # === DRAW ALL STIMULI ===
+                # Top row, response cues and current-letter highlight
+                stim_screens[i].draw()
+
+                if is_letter_trial:
+                    # Center letter shown visually
+                    center_stim.text = letter
+                    center_stim.draw()
+                else:
+                    # Keep fixation
+                    fixation.draw()
 
-            win.flip()
+                    # Play audio, started on the flip like the visual letter
+                    snd = sounds[letter]
+                    if snd is not None:
+                        win.callOnFlip(snd.play)
 
-            # === RESPONSE ===
-            clock.reset()
-            keys = event.waitKeys(keyList=['k', 'd'],timeStamped=clock)
-            
-            response_key = keys[0][0] if keys else None
-            rt = keys[0][1] if keys else None
-            correct = (response_key == correct_resp) if response_key else None
-            
-            center_stim.text = letter
+                win.callOnFlip(markers.send, f"stim/train_1/{i + 1}/{letter}", responses, i)
+                win.flip()
 
-            if correct:
-                responded_correctly = True
-            else:
-                # === Feedback Screen ===
-                for stim in demo_texts[:i+1]:
-                    stim.draw()
-                center_stim.draw()
-                demo_box.draw()
-                bottom_left.draw()
-                bottom_right.draw()
-                incorrect_text.draw()
-
-                if demo_sequence[i] == '1' and i >= 2:
-                    match_box.pos = (-270 + (i - 2) * demo_spacing, demo_pos_y)
-                    match_box.draw()
+                # === RESPONSE ===
+                clock.reset()
+                keys = event.waitKeys(keyList=['k', 'd'],timeStamped=clock)
                 
-                if correct_resp == 'k':
-                    response_highlight.pos = (300, -250)
-                    explanation_text.text = "This letter is the same as two steps ago, so the correct answer is 'k'."
-                    explanation_text.pos = (180, -180)
-                else:
-                    response_highlight.pos = (-300, -250)
-                    explanation_text.text = "This letter is different from two steps ago, so the correct answer is 'd'."
-                    explanation_text.pos = (-180, -180)
+                response_key = keys[0][0] if keys else None
+                rt = keys[0][1] if keys else None
+                correct = score_response(response_key, correct_resp)
 
-                response_highlight.draw()
-                explanation_text.draw()
-                win.flip()
+                if correct:
+                    responded_correctly = True
+                else:
+                    # === Feedback Screen ===
+                    feedback_screens[i].draw()
+                    win.flip()
 
-                event.waitKeys(keyList=['space'])  # Wait for user to continue
-                responded_correctly = True  # Still move on after explanation
-        
-            # === Append Response ===
-            responses.append({
-                'ppt_ID': ppt_id,
-                'condition': condition, 
-                'section': 'train_1',
-                'trial': i + 1,
-                'stim': letter,
-                'is_target': demo_sequence[i] == 1,
-                'response': response_key,
-                'rt': rt,
-                'correct': correct
-            })
-        
-    return responses
+                    event.waitKeys(keyList=['space'])  # Wait for user to continue
+                    responded_correctly = True  # Still move on after explanation
+            
+                # === Record Response ===
+                responses[i, 'response'] = response_key
+                responses[i, 'rt'] = rt
+                responses[i, 'rt_corrected'] = correct_rt(rt, calibration, audio=not is_letter_trial)
+                responses[i, 'correct'] = correct
+            
+        return responses
+    return run
 
 # === FUNC: N-Back training demo 2 ===
-def run_training_demo_2(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition):
+def prepare_training_demo_2(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition):
     # === DEMO 2 SETUP ===
     demo_sequence = '0001001001'
     demo_letters = ['W', 'C', 'G', 'C', 'K', 'P', 'K', 'H', 'Q', 'H']
@@ -233,457 +335,161 @@ def run_training_demo_2(is_letter_trial, win, audio_folder, stim_duration, feedb
     demo_box = visual.Rect(win, width=50, height=60, lineColor=highlight_color, pos=(0, 0))
     match_box = visual.Rect(win, width=50, height=60, lineColor=highlight_color, pos=(0, 0))
     response_highlight = visual.Rect(win, width=140, height=60, lineColor=highlight_color, pos=(0, 0))
+
+    # === PRE-RENDER COMPOSITE SCREENS ===
+    # Response cues never change; the explanation screen only differs in feedback text.
+    cue_screen = make_composite(win, [bottom_left, bottom_right])
+    feedback_screens = []
+    for i in range(len(demo_letters)):
+        overlays = place_demo_markers(i, demo_sequence, demo_box, match_box, response_highlight, explanation_text, demo_pos_y, demo_spacing)
+        feedback_screens.append(make_composite(win, demo_texts[:i+1] + [bottom_left, bottom_right, move_on_text] + overlays))
+
+    sounds = {} if is_letter_trial else load_letter_sounds(audio_folder, demo_letters)
     
-    # === TRIAL LOOP ===
-    responses = []
-    clock = core.Clock()
-    
+    responses = new_nback_store('train_2', len(demo_letters))
     for i, letter in enumerate(demo_letters):
-        correct_resp = 'k' if demo_sequence[i] == '1' else 'd'
-        responded_correctly = False
-
-        while not responded_correctly:
-            # === Fixation ITI ===
-            fixation.draw()
-            win.flip()
-            core.wait(iti_duration)
+        responses[i, 'trial'] = i + 1
+        responses[i, 'stim'] = letter
+        responses[i, 'is_target'] = demo_sequence[i] == 1
+    clock = core.Clock()
+    # Response window: whole frames from the stimulus flip (see calibration.py)
+    response_window = frame_locked(stim_duration, calibration, fallback_frame_interval)
 
-            # === Stimulus Screen ===
-            if is_letter_trial:
-                center_stim.text = letter
-                center_stim.draw()
-            else:
-                # Keep fixation and play sound
-                try:
+    # === TRIAL LOOP ===
+    def run():
+        for i, letter in enumerate(demo_letters):
+            correct_resp = 'k' if demo_sequence[i] == '1' else 'd'
+            responded_correctly = False
+
+            while not responded_correctly:
+                # === Fixation ITI ===
+                show_frames([fixation], iti_duration)
+
+                # === Stimulus Screen ===
+                cue_screen.draw()
+                if is_letter_trial:
+                    center_stim.text = letter
+                    center_stim.draw()
+                else:
+                    # Keep fixation and play sound
                     fixation.draw()
-                    snd = sound.Sound(os.path.join(audio_folder, f"{letter}.wav"))
-                    snd.play()
-                except Exception as e:
-                    print(f"Audio error: {e}")
-
-            bottom_left.draw()
-            bottom_right.draw()
-            win.flip()
-
-            # === Wait for Response ===
-            clock.reset()
-            keys = event.waitKeys(maxWait=stim_duration, keyList=['k', 'd'], timeStamped=clock)
-            
-            response_key = keys[0][0] if keys else None
-            rt = keys[0][1] if keys else None
-            correct = (response_key == correct_resp) if response_key else None
-
-            # === Feedback Text ===
-            if response_key is None:
-                feedback_stim.text = "Too slow"
-            elif correct:
-                feedback_stim.text = "Correct"
-            else:
-                feedback_stim.text = "Incorrect"
+                    snd = sounds[letter]
+                    if snd is not None:
+                        win.callOnFlip(snd.play)
 
-            if correct:
-                feedback_stim.draw()
+                win.callOnFlip(markers.send, f"stim/train_2/{i + 1}/{letter}", responses, i)
                 win.flip()
-                core.wait(feedback_duration)
-                responded_correctly = True
-            else:
-                # === Feedback + Explanation Screen ===
-                for stim in demo_texts[:i+1]:
-                    stim.draw()
-                demo_box.pos = (-270 + i * demo_spacing, demo_pos_y)
-                demo_box.draw()
-
-                bottom_left.draw()
-                bottom_right.draw()
-                feedback_stim.draw()
-                move_on_text.draw()
-
-                if demo_sequence[i] == '1' and i >= 2:
-                    match_box.pos = (-270 + (i - 2) * demo_spacing, demo_pos_y)
-                    match_box.draw()
-
-                if correct_resp == 'k':
-                    response_highlight.pos = (300, -250)
-                    explanation_text.text = "This letter is the same as two steps ago, so the correct answer is 'k'."
-                    explanation_text.pos = (180, -180)
+
+                # === Wait for Response ===
+                clock.reset()
+                keys = event.waitKeys(maxWait=response_window, keyList=['k', 'd'], timeStamped=clock)
+                
+                response_key = keys[0][0] if keys else None
+                rt = keys[0][1] if keys else None
+                correct = score_response(response_key, correct_resp)
+
+                # === Feedback Text ===
+                if response_key is None:
+                    feedback_stim.text = "Too slow"
+                elif correct:
+                    feedback_stim.text = "Correct"
                 else:
-                    response_highlight.pos = (-300, -250)
-                    explanation_text.text = "This letter is different from two steps ago, so the correct answer is 'd'."
-                    explanation_text.pos = (-180, -180)
+                    feedback_stim.text = "Incorrect"
 
-                response_highlight.draw()
-                explanation_text.draw()
-                win.flip()
+                if correct:
+                    show_frames([feedback_stim], feedback_duration)
+                    responded_correctly = True
+                else:
+                    # === Feedback + Explanation Screen ===
+                    feedback_screens[i].draw()
+                    feedback_stim.draw()
+                    win.flip()
 
-                event.waitKeys(keyList=['space'])
-                responded_correctly = True
-                
-            # === Append Response ===
-            responses.append({
-                'ppt_ID': ppt_id,
-                'condition': condition, 
-                'section': 'train_2',
-                'trial': i + 1,
-                'stim': letter,
-                'is_target': demo_sequence[i] == 1,
-                'response': response_key,
-                'rt': rt,
-                'correct': correct
-            })
-        
-    return responses
+                    event.waitKeys(keyList=['space'])
+                    responded_correctly = True
+                    
+                # === Record Response ===
+                responses[i, 'response'] = response_key
+                responses[i, 'rt'] = rt
+                responses[i, 'rt_corrected'] = correct_rt(rt, calibration, audio=not is_letter_trial)
+                responses[i, 'correct'] = correct
+            
+        return responses
+    return run
 
 # === FUNC: N-Back Test ===
-def run_test(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition, section):
+def prepare_test(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition, section):
     # === N-BACK TASK PARAMETERS ===
     n_back = 2
     total_blocks = 1 # 5 blocks × 10 trials = 50 total
     trials_per_block = 10
+    targets_per_block = 3
     
     # === GENERATE TRIAL SEQUENCE ===
-    sequence = []
-    sequence.extend([0]*n_back)
-    for _ in range(total_blocks):
-        block = [1]*3 + [0]*7
-        random.shuffle(block)
-        sequence.extend(block)
-    
-    stim_list = []
-    for i, is_target in enumerate(sequence):
-        if i < n_back:
-            stim_list.append(random.choice(letters))
-        else:
-            if is_target:
-                stim_list.append(stim_list[i - n_back])
-            else:
-                non_match = random.choice(letters)
-                while non_match == stim_list[i - n_back]:
-                    non_match = random.choice(letters)
-                stim_list.append(non_match)
+    sequence = generate_targets(n_back, total_blocks, trials_per_block, targets_per_block)
+    stim_list = generate_stim_list(sequence, n_back, letters)
     
     # Visual elements
     fixation = visual.TextStim(win, text='+', color='white', height=40)
     center_stim = visual.TextStim(win, text='', color='white', height=60, pos=(0, 0))
     feedback_stim = visual.TextStim(win, text='', color='white', height=40, pos=(0, 0))
 
-    # === RUN THE TASK ===
-    responses = []
-    clock = core.Clock()
+    sounds = {} if is_letter_trial else load_letter_sounds(audio_folder, stim_list)
 
+    responses = new_nback_store(section, len(stim_list))
     for i, letter in enumerate(stim_list):
-        # Fixation
-        fixation.draw()
-        win.flip()
-        core.wait(iti_duration)
-
-        # UI elements
-        if is_letter_trial:
-            center_stim.text = letter
-            center_stim.draw()
-        else:
-            try:
-                fixation.draw()
-                snd = sound.Sound(os.path.join(audio_folder, f"{letter}.wav"))
-                snd.play()
-            except Exception as e:
-                print(f"Audio error for {letter}: {e}")
-        win.flip()       
-
-        clock.reset()
-        keys = event.waitKeys(maxWait=stim_duration, keyList=['k', 'd'], timeStamped=clock)
-
-        correct_response = 'k' if i >= n_back and stim_list[i] == stim_list[i - n_back] else 'd'
-        response_key = keys[0][0] if keys else None
-        rt = keys[0][1] if keys else None
-        correct = (response_key == correct_response) if response_key else None
-
-        # Show feedback
-        if response_key is None:
-            feedback_stim.text = "Too slow"
-        elif correct:
-            feedback_stim.text = "Correct"
-        else:
-            feedback_stim.text = "Incorrect"
-        feedback_stim.draw()
-        win.flip()
-        core.wait(feedback_duration)
-
-        responses.append({
-            'ppt_ID': ppt_id,
-            'condition': condition,
-            'section': section,
-            'trial': i + 1,
-            'stim': letter,
-            'is_target': i >= n_back and stim_list[i] == stim_list[i - n_back],
-            'response': response_key,
-            'rt': rt,
-            'correct': correct
-        })
-        
-    return responses
-
-# === BEGINNING STUDY INSTRUCTIONS ====
-
-# Welcome
-welcome_text = '''
-Welcome! This study has three parts. 
-
-- First, you will see or hear a sequence of letters and determine any letters that are repeated. 
-- Next, you will read several passages and answer some questions about them.
-- Finally, you will repeat the letter sequence task. 
-
-Press [SPACE] to begin
-'''
-
-welcome_page = visual.TextStim(
-    win, 
-    text= welcome_text, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-welcome_page.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
+        responses[i, 'trial'] = i + 1
+        responses[i, 'stim'] = letter
+        responses[i, 'is_target'] = is_target(stim_list, i, n_back)
+    clock = core.Clock()
+    # Response window: whole frames from the stimulus flip (see calibration.py)
+    response_window = frame_locked(stim_duration, calibration, fallback_frame_interval)
 
-# === N-Back INSTRUCTION ===
-# Move on text
-move_on_text = visual.TextStim(
-    win,
-    text="Press [SPACE] to move on.",
-    pos=(0, -300), 
-    height=22,
-    alignText='center',
-    color='white',
-    wrapWidth=800
-)
+    # === RUN THE TASK ===
+    def run():
+        for i, letter in enumerate(stim_list):
+            # Fixation
+            show_frames([fixation], iti_duration)
 
-start_game_text = visual.TextStim(
-    win,
-    text="Press [SPACE] when you are ready to begin.",
-    pos=(0, -300),
-    height=22,
-    alignText='center',
-    color='white',
-    wrapWidth=800
-)
+            # UI elements
+            if is_letter_trial:
+                center_stim.text = letter
+                center_stim.draw()
+            else:
+                fixation.draw()
+                snd = sounds[letter]
+                if snd is not None:
+                    win.callOnFlip(snd.play)
+            win.callOnFlip(markers.send, f"stim/{section}/{i + 1}/{letter}", responses, i)
+            win.flip()       
 
+            clock.reset()
+            keys = event.waitKeys(maxWait=response_window, keyList=['k', 'd'], timeStamped=clock)
 
-# N-Back Train 1
-n_back_train_1_instruction_1 = '''
-Before we begin, let’s practice the letter sequence task. 
-
-In this task, you will {modality} a series of letters one-by-one. 
-
-Your goal is to remember the letter sequence and press:
-- K if the current letter is the SAME as the one {modality2} 2 letters ago
-- D if it is DIFFERENT
-'''.format(
-    modality="see" if is_letter_trial else "hear",
-    modality2="seen" if is_letter_trial else "heard")
-
-n_back_train_1_instruction_2 = '''
-In this practice round, you will see the letters at the top of the screen to help show you the letter sequence. 
-
-The current letter will be highlighted, and if there's a match, the letter from two steps ago will be highlighted too.
-
-You'll get feedback after each answer. If you're wrong, it will explain why. This is so you become familiar with this task. 
-'''.format(modality="see" if is_letter_trial else "hear")
-
-n_back_train_1_instruction_3 = '''
-Remember, your goal is to press:
-- K if the current letter is the SAME as the one {modality} 2 letters ago
-- D if it is DIFFERENT
-'''.format(modality="seen" if is_letter_trial else "heard")
-
-# N-Back Train 2
-n_back_train_2_instruction_1 = """
-Great Job! You've learned the basic setup of the task. 
-
-Next, you'll have another practice round. 
-
-In this round: 
-    - The letter sequence at the top will no longer be shown. 
-    - You'll have limited time to respond, so please respond as quickly and accurately as possible 
-    - You'll still recieve feedback, but the letter sequence, highlight boxes, and explaination will only appear if your answer is incorrect.
-""".format(modality="see" if is_letter_trial else "hear")
-
-n_back_train_2_instruction_2 = """
-Remember, your goal is to press:
-- 'K' if the current letter is the SAME as the one {modality} 2 letters ago
-- 'D' if it is DIFFERENT
-""".format(modality="seen" if is_letter_trial else "heard")
-
-# N-Back Pre Test
-n_back_pre_test_instruction_1 = """
-You are ready to begin the study! 
-
-The letter list and highlights will not appear in this test session. 
-"""
-
-n_back_pre_test_instruction_2 = """
-Remember, press:
-- 'K' if the current letter is the SAME as the one {modality} 2 letters ago
-- 'D' if it is DIFFERENT
-Respond as quickly and accurately as you can. You’ll receive short feedback after each response.
-""".format(modality="seen" if is_letter_trial else "heard")
-
-# N-Back Post Test
-n_back_post_test_instruction = '''
-You will complete the letter task again. 
-Remember, press:
-- K if the current letter is the SAME as the one {modality} 2 letters ago
-- D if it is DIFFERENT
-Respond as quickly and accurately as you can. You’ll receive short feedback after each response.
-'''.format(modality="seen" if is_letter_trial else "heard")
-
-
-# ================ RUN N-BACK ================
-
-all_responses = []
-results = []
-# === Instruction: training demo 1 ===
-instruction_t1_1 = visual.TextStim(
-    win, 
-    text=n_back_train_1_instruction_1, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-instruction_t1_2 = visual.TextStim(
-    win, 
-    text=n_back_train_1_instruction_2, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-    
-instruction_t1_3 = visual.TextStim(
-    win, 
-    text=n_back_train_1_instruction_3, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-# instruction_t1_1
-instruction_t1_1.draw()
-move_on_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# instruction_t1_2
-instruction_t1_2.draw()
-move_on_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# instruction_t1_3
-instruction_t1_3.draw()
-start_game_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# === Run training demo 1 ===
-train1_responses = run_training_demo_1(is_letter_trial, win, audio_folder, iti_duration, condition)
-
-# === Instruction: training demo 2 ===
-instruction_t2_1 = visual.TextStim(
-    win, 
-    text=n_back_train_2_instruction_1, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-instruction_t2_2 = visual.TextStim(
-    win, 
-    text=n_back_train_2_instruction_2, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-# instruction_t2_1
-instruction_t2_1.draw()
-move_on_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# instruction_t2_2
-instruction_t2_2.draw()
-start_game_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# === Run training demo 2 ===
-train2_responses = run_training_demo_2(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition)
-
-
-# === Instruction: N-back pre-test === 
-instruction_pre_1 = visual.TextStim(
-    win, 
-    text=n_back_pre_test_instruction_1, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-instruction_pre_2 = visual.TextStim(
-    win, 
-    text=n_back_pre_test_instruction_2, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-    
-instruction_pre_1.draw()
-move_on_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
+            correct_key = correct_response(stim_list, i, n_back)
+            response_key = keys[0][0] if keys else None
+            rt = keys[0][1] if keys else None
+            correct = score_response(response_key, correct_key)
 
-instruction_pre_2.draw()
-start_game_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
+            # Show feedback
+            if response_key is None:
+                feedback_stim.text = "Too slow"
+            elif correct:
+                feedback_stim.text = "Correct"
+            else:
+                feedback_stim.text = "Incorrect"
+            show_frames([feedback_stim], feedback_duration)
 
-# === Run N-Back Pre Test ===
-pre_responses = run_test(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition, section = 'pre')
+            responses[i, 'response'] = response_key
+            responses[i, 'rt'] = rt
+            responses[i, 'rt_corrected'] = correct_rt(rt, calibration, audio=not is_letter_trial)
+            responses[i, 'correct'] = correct
+            
+        return responses
+    return run
 
 # === PASSAGE ===
 
-# Allow 9 to exit study
-def get_response(key_list, timing=False):
-    if timing:
-        clock = core.Clock()
-        keys = event.waitKeys(keyList=key_list, timeStamped=clock)
-        key, rt = keys[0]
-        if key == '9':
-            win.close()
-            core.quit()
-        return key, rt
-    else:
-        keys = event.waitKeys(keyList=key_list)
-        if '9' in keys:
-            win.close()
-            core.quit()
-        return keys[0]
-        
-
-# Instructions
-
-passage_instruction = """
-In this next task, you will read three passages, each on a different topic. 
-
-Read each passage carefully to fully understand it.
-
-After each one, you will answer some questions about what you read. Do your best to answer correctly. 
-
-Press [SPACE] to begin.
-"""
-
 continue_text = visual.TextStim(
     win,
     text="Press [SPACE] to continue.",
@@ -694,160 +500,167 @@ continue_text = visual.TextStim(
     wrapWidth=800
 )
 
-passage_instruction_1 = visual.TextStim(
-    win, 
-    text=passage_instruction, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-passage_instruction_1.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-_, rt = get_response(['space'], timing=True)
-
-results.append({
-    'participant': ppt_id,
-    'topic': 'instructions',
-    'trial': 0,
-    'question_num': 'instruction_screen',
-    'condition': difficulty,
-    'response': 'space',
-    'reaction_time': rt
-})
-
 text_stim = visual.TextStim(win, color='white', height=28, wrapWidth=800, alignText='left', anchorHoriz='center', pos=(0, 0))
 
 # Comprehension questions
-def ask_question(row, idx, qnum):
-    topic = str(row['Topic'])
-    question = str(row[f'Comprehension_Q{qnum}'])
-    correct_answer = str(row[f'Comprehension_Q{qnum}_Option_1_answer'])
-    options = [correct_answer] + [str(row[f'Comprehension_Q{qnum}_Option_{i}']) for i in range(2, 5)]
-    random.shuffle(options)
-    correct_key = str(options.index(correct_answer) + 1)
-
-    full_text = f"{question}\n\n"
-    for i, opt in enumerate(options):
-        full_text += f"{i+1}. {opt}\n"
-    text_stim.text = full_text
+def ask_question(item, idx, qnum, results):
+    topic = item.topic
+    q = item.questions[qnum - 1]
+    question = q.text
+    correct_answer = q.correct_answer
+    options, correct_key = shuffle_options(q)
+
+    text_stim.text = question_text(q, options)
     text_stim.draw()
+    row = results.next_row()
+    win.callOnFlip(markers.send, f"question/{item.item_id}/{qnum}", results, row)
     win.flip()
 
     response, rt = get_response(['1', '2', '3', '4', '9'], timing=True)
     is_correct = (response == correct_key)
 
-    results.append({
-        'participant': ppt_id,
-        'topic': topic,
-        'trial': idx + 1,
-        'question_num': str(qnum),
-        'condition': difficulty,
-        'response': response,
-        'correct_key': correct_key,
-        'is_correct': is_correct,
-        'question': question,
-        'correct_answer': correct_answer,
-        'option_1': options[0],
-        'option_2': options[1],
-        'option_3': options[2],
-        'option_4': options[3],
-        'reaction_time': rt
-    })
+    results[row, 'topic'] = topic
+    results[row, 'item_id'] = item.item_id
+    results[row, 'trial'] = idx + 1
+    results[row, 'question_num'] = str(qnum)
+    results[row, 'response'] = response
+    results[row, 'correct_key'] = correct_key
+    results[row, 'is_correct'] = is_correct
+    results[row, 'question'] = question
+    results[row, 'correct_answer'] = correct_answer
+    for i, opt in enumerate(options):
+        results[row, f'option_{i+1}'] = opt
+    results[row, 'reaction_time'] = rt
     core.wait(1)
 
-# Loop through passages
-for idx, row in df.iterrows():
-    for field in field_cols:
-        if pd.isna(row[field]):
-            continue
-        text_stim.text = str(row[field])
-        text_stim.draw()
-        continue_text.draw()
+# Self-paced page: each SPACE reveals the next word. The word clock is reset
+# on the flip that shows the word, so RTs are measured from its onset.
+# Returns the total reading time for the page.
+word_clock = core.Clock()
+
+def read_page_self_paced(layout, item, idx, page_num, results, word_window):
+    word_aperture, word_patch = word_window
+    page_time = 0
+    for word in layout.words:
+        draw_word(layout, word, word_aperture, word_patch)
+        row = results.next_row()
+        win.callOnFlip(word_clock.reset)
+        win.callOnFlip(markers.send, f"word/{item.item_id}/{page_num}/{word.index + 1}", results, row)
+        onset = win.flip()
+
+        key, rt = event.waitKeys(keyList=['space', '9'], timeStamped=word_clock)[0]
+        if key == '9':
+            win.close()
+            core.quit()
+        page_time += rt
+
+        results[row, 'topic'] = item.topic
+        results[row, 'item_id'] = item.item_id
+        results[row, 'trial'] = idx + 1
+        results[row, 'question_num'] = 'word'
+        results[row, 'page'] = page_num
+        results[row, 'word_index'] = word.index + 1
+        results[row, 'word'] = word.text
+        results[row, 'onset'] = onset
+        results[row, 'response'] = key
+        results[row, 'reaction_time'] = rt
+    return page_time
+
+def prepare_passages(instruction_text):
+    passage_instruction_1 = visual.TextStim(
+        win, 
+        text=instruction_text, 
+        color='white', 
+        height=28, 
+        wrapWidth=800, 
+        alignText='left')
+
+    # Passages for this participant (balanced sample across topics for this difficulty)
+    passages = item_bank.sample(difficulty, n_passages)
+
+    # Self-paced reading: lay out every page before the session starts
+    page_layouts = {}
+    word_window = None
+    if reading_mode == 'self_paced':
+        font_metrics = measure_font(win, self_paced_font, 28)
+        page_layouts = {
+            (item.item_id, page_num): build_page(win, page, font_metrics, self_paced_font, 28, 800)
+            for item in passages for page_num, page in enumerate(item.pages, start=1)
+        }
+        word_window = make_word_window(win)
+
+    # Passage events: the instruction screen, one row per page and one per question
+    # (plus one per word in self-paced mode). Counted over the pages as they
+    # will be shown, so a passage that appears twice is counted twice.
+    n_passage_events = 1 + sum(len(item.pages) + len(item.questions) for item in passages)
+    if reading_mode == 'self_paced':
+        n_passage_events += sum(len(page_layouts[(item.item_id, page_num)].words)
+                                for item in passages for page_num in range(1, len(item.pages) + 1))
+    results = TrialStore(n_passage_events, passage_fields,
+                         {'participant': ppt_id, 'calibration_id': calibration_id, 'condition': difficulty})
+
+    def run():
+        sync_markers('passages')
+
+        passage_instruction_1.draw()
         win.flip()
-        _, rt = get_response(['space', '9'], timing=True)
-
-        results.append({
-            'participant': ppt_id,
-            'topic': row['Topic'],
-            'trial': idx + 1,
-            'question_num': 'passage',
-            'condition': difficulty,
-            'response': 'space',
-            'reaction_time': rt
-        })
-
-    core.wait(0.5)
-    ask_order = [1, 2]
-    random.shuffle(ask_order)
-    for qnum in ask_order:
-        ask_question(row, idx, qnum)
-
-# === Instruction: N-back Post Test === 
-instruction_post = visual.TextStim(
-    win, 
-    text=n_back_post_test_instruction, 
-    color='white', 
-    height=28, 
-    wrapWidth=800, 
-    alignText='left')
-
-instruction_post.draw()
-start_game_text.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-# === Run N-Back Post Test ===
-post_responses = run_test(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition, section = 'post')
-
-# === Combine responses to one dictionary and save ===
-all_responses.extend(train1_responses)
-all_responses.extend(train2_responses)
-all_responses.extend(pre_responses)
-all_responses.extend(post_responses)
-
-# Save combined responses
-df = pd.DataFrame(all_responses)
-filename = f"data/{ppt_id}-{remainder}-{current_date}_nback.csv"
-df.to_csv(filename, index=False)
-
-
-# Demographic intro screen
-text_stim.text = "Finally, please answer some questions about yourself. \n Press [SPACE] to continue."
-text_stim.draw()
-win.flip()
-event.waitKeys(keyList=['space'])
-
-demographics = {}
+        event.waitKeys(keyList=['space'])
+
+        _, rt = get_response(['space'], timing=True)
+
+        row = results.next_row()
+        results[row, 'topic'] = 'instructions'
+        results[row, 'trial'] = 0
+        results[row, 'question_num'] = 'instruction_screen'
+        results[row, 'response'] = 'space'
+        results[row, 'reaction_time'] = rt
+
+        # Loop through passages
+        for idx, item in enumerate(passages):
+            for page_num, page in enumerate(item.pages, start=1):
+                row = results.next_row()
+                win.callOnFlip(markers.send, f"page/{item.item_id}/{page_num}", results, row)
+                if reading_mode == 'self_paced':
+                    rt = read_page_self_paced(page_layouts[(item.item_id, page_num)], item, idx, page_num, results, word_window)
+                else:
+                    text_stim.text = page
+                    text_stim.draw()
+                    continue_text.draw()
+                    win.flip()
+                    _, rt = get_response(['space', '9'], timing=True)
+
+                results[row, 'topic'] = item.topic
+                results[row, 'item_id'] = item.item_id
+                results[row, 'trial'] = idx + 1
+                results[row, 'question_num'] = 'passage'
+                results[row, 'page'] = page_num
+                results[row, 'response'] = 'space'
+                results[row, 'reaction_time'] = rt
+
+            core.wait(0.5)
+            ask_order = [1, 2]
+            random.shuffle(ask_order)
+            for qnum in ask_order:
+                ask_question(item, idx, qnum, results)
+
+        return results
+    return run
+
+# === DEMOGRAPHICS ===
 
 # Demographic multiple choice questions
-def ask_multiple_choice(win, text, key_list, height=28):
-    text_stim.text = text
-    text_stim.height = height
-    text_stim.draw()
+def ask_multiple_choice(win, question_stim, key_list):
+    question_stim.draw()
     win.flip()
     return event.waitKeys(keyList=key_list)[0]
 
-demographics['participant'] = ppt_id
-
-demographics['Effort'] = ask_multiple_choice(win, "How effortful was this study?\n\n1. Not at all\n2. Slightly\n3. Moderately\n4. Quite a bit\n5. Very much", ['1', '2', '3', '4', '5'])
-demographics['Gender'] = ask_multiple_choice(win, "What is your gender?\n\n1. Male\n2. Female\n3. Non-binary\n4. Prefer not to say", ['1', '2', '3', '4'])
-demographics['Race'] = ask_multiple_choice(win, "What race do you identify with?\n\n1. Asian\n2. White\n3. Black\n4. Latinx\n5. Multiracial\n6. Prefer not to say", ['1', '2', '3', '4', '5', '6'])
-demographics['Education'] = ask_multiple_choice(win, "What is the highest level of education completed?\n\n1. Some high school\n2. High school graduate\n3. 2-year college degree\n4. 4-year college degree\n5. Graduate degree", ['1', '2', '3', '4', '5'])
-
 # Numeric age input
-def ask_numeric_response(win, prompt_text, height=28):
+def ask_numeric_response(win, stims):
+    prompt_stim, input_stim, box, error_stim = stims
     response = ''
     valid = False
-    prompt_stim = visual.TextStim(win, text='', pos=(0, 100), height=height, color='white', wrapWidth=800)
-    input_stim = visual.TextStim(win, text='', pos=(0, 0), height=height, color='white')
-    box = visual.Rect(win, width=500, height=100, fillColor='grey', lineColor='white', pos=(0, 0))
-    error_stim = visual.TextStim(win, text='Please enter a valid number.', pos=(0, -300), height=22, color='red')
 
     while not valid:
-        prompt_stim.text = prompt_text
         input_stim.text = response
         prompt_stim.draw()
         box.draw()
@@ -882,52 +695,188 @@ def ask_numeric_response(win, prompt_text, height=28):
 
     return int(response)
 
-demographics['Age'] = int(ask_numeric_response(win, "In years, what is your age?"))
-
-# Wait for clean space
-while event.getKeys(keyList=['space']):
-    continue
-core.wait(0.1)
-event.clearEvents()
-event.waitKeys(keyList=['space'])
-
-# Comment section
-question_stim = visual.TextStim(win, text='Thank you for taking part in this study! Please let us know if you have any comments or concerns.', pos=(0, 150), height=28, color='white')
-response_text = visual.TextStim(win, text='', pos=(0, 0), height=28, color='white', alignText='left', anchorHoriz='center')
-continue_stim = visual.TextStim(win, text='Press ENTER to submit', pos=(0, -300), height=22, color='white')
-box = visual.Rect(win, width=800, height=200, fillColor='grey', lineColor='white', pos=(0, 0))
+# Free-text comments, submitted with ENTER
+def ask_comments(win, stims):
+    question_stim, response_text, continue_stim, box = stims
+    response = ''
+    typing = True
 
-response = ''
-typing = True
+    while typing:
+        question_stim.draw()
+        box.draw()
+        response_text.text = response
+        response_text.draw()
+        continue_stim.draw()
 
-while typing:
-    question_stim.draw()
-    box.draw()
-    response_text.text = response
-    response_text.draw()
-    continue_stim.draw()
+        win.flip()
 
-    win.flip()
+        keys = event.getKeys()
+        for key in keys:
+            if key == 'return':
+                typing = False
+            elif key == 'backspace':
+                response = response[:-1]
+            elif key == 'space':
+                response += ' '
+            elif key in ['lshift', 'rshift', 'shift']:
+                continue
+            elif len(key) == 1:
+                response += key
 
-    keys = event.getKeys()
-    for key in keys:
-        if key == 'return':
-            typing = False
-        elif key == 'backspace':
-            response = response[:-1]
-        elif key == 'space':
-            response += ' '
-        elif key in ['lshift', 'rshift', 'shift']:
+    return response
+
+def prepare_demographics(questions, age_prompt, comment_prompt, height=28):
+    choice_stims = []
+    for q in questions:
+        text = f"{q['text']}\n\n" + "\n".join(f"{i}. {opt}" for i, opt in enumerate(q['options'], start=1))
+        stim = visual.TextStim(win, text=text, color='white', height=height, wrapWidth=800, alignText='left', anchorHoriz='center', pos=(0, 0))
+        choice_stims.append((q['name'], stim, [str(i) for i in range(1, len(q['options']) + 1)]))
+
+    age_stims = (
+        visual.TextStim(win, text=age_prompt, pos=(0, 100), height=height, color='white', wrapWidth=800),
+        visual.TextStim(win, text='', pos=(0, 0), height=height, color='white'),
+        visual.Rect(win, width=500, height=100, fillColor='grey', lineColor='white', pos=(0, 0)),
+        visual.TextStim(win, text='Please enter a valid number.', pos=(0, -300), height=22, color='red')
+    )
+
+    comment_stims = (
+        visual.TextStim(win, text=comment_prompt, pos=(0, 150), height=28, color='white'),
+        visual.TextStim(win, text='', pos=(0, 0), height=28, color='white', alignText='left', anchorHoriz='center'),
+        visual.TextStim(win, text='Press ENTER to submit', pos=(0, -300), height=22, color='white'),
+        visual.Rect(win, width=800, height=200, fillColor='grey', lineColor='white', pos=(0, 0))
+    )
+
+    def run():
+        demographics = {}
+        demographics['participant'] = ppt_id
+        demographics['calibration_id'] = calibration_id
+
+        for name, stim, key_list in choice_stims:
+            demographics[name] = ask_multiple_choice(win, stim, key_list)
+
+        demographics['Age'] = int(ask_numeric_response(win, age_stims))
+
+        # Wait for clean space
+        while event.getKeys(keyList=['space']):
             continue
-        elif len(key) == 1:
-            response += key
-
-demographics['Comments'] = response
-
-
-# Save data
-pd.DataFrame(results).to_csv(f"data/{ppt_id}-{remainder}-{current_date}_passagedata.csv", index=False)
-pd.DataFrame([demographics]).to_csv(f"data/{ppt_id}-{remainder}-{current_date}_demographics.csv", index=False)
-
-win.close()
-core.quit()
\ No newline at end of file
+        core.wait(0.1)
+        event.clearEvents()
+        event.waitKeys(keyList=['space'])
+
+        demographics['Comments'] = ask_comments(win, comment_stims)
+        return demographics
+    return run
+
+# === SESSION TIMELINE ===
+# The session flow is defined in timeline.yaml. Each phase type maps to a
+# builder below; a builder does all construction for its phase when the
+# timeline is compiled and returns run(inputs), which only presents it.
+timeline_path = "timeline.yaml"
+
+modality_words = {
+    'see_hear': "see" if is_letter_trial else "hear",
+    'seen_heard': "seen" if is_letter_trial else "heard",
+}
+
+def fill_text(text):
+    return text.format_map(modality_words)
+
+# Timed n-back blocks: sync marker clocks, then run in real-time mode
+def timed_block(block_id, run_block):
+    def run(inputs):
+        sync_markers(block_id)
+        with realtime.block(block_id):
+            return run_block()
+    return run
+
+def build_instruction(phase):
+    body = visual.TextStim(
+        win, 
+        text=fill_text(phase['text']), 
+        color='white', 
+        height=28, 
+        wrapWidth=800, 
+        alignText='left')
+    footer = footer_stims[phase['footer']] if phase.get('footer') else None
+
+    def run(inputs):
+        body.draw()
+        if footer is not None:
+            footer.draw()
+        win.flip()
+        event.waitKeys(keyList=['space'])
+    return run
+
+def build_training_demo_1(phase):
+    return timed_block(phase['id'], prepare_training_demo_1(is_letter_trial, win, audio_folder, iti_duration, condition))
+
+def build_training_demo_2(phase):
+    return timed_block(phase['id'], prepare_training_demo_2(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition))
+
+def build_nback_test(phase):
+    section = phase.get('section', phase['id'])
+    return timed_block(phase['id'], prepare_test(is_letter_trial, win, audio_folder, stim_duration, feedback_duration, iti_duration, condition, section))
+
+def build_passages(phase):
+    instruction = phase['self_paced_instruction'] if reading_mode == 'self_paced' else phase['instruction']
+    run_passages = prepare_passages(fill_text(instruction))
+    return lambda inputs: run_passages()
+
+def build_demographics(phase):
+    run_demographics = prepare_demographics(phase['questions'], phase['age_prompt'], phase['comment_prompt'])
+    return lambda inputs: run_demographics()
+
+# Written in the background (see export.py); the next phase starts immediately
+def build_export(phase):
+    path = f"{data_folder}{ppt_id}-{remainder}-{current_date}_{phase['file']}.csv"
+
+    def run(inputs):
+        writer.write_csv(list(inputs), path)
+        return path
+    return run
+
+def build_finish(phase):
+    saving_stim = visual.TextStim(win, text="Saving your responses...", color='white', height=28, wrapWidth=800, alignText='left', anchorHoriz='center', pos=(0, 0))
+
+    def run(inputs):
+        if markers.enabled:
+            sync_markers('end')
+            writer.write_csv(markers.sync_log, f"{data_folder}{ppt_id}-{remainder}-{current_date}_markersync.csv")
+            if markers.dropped:
+                logging.warning(f"markers: {markers.dropped} markers could not be sent")
+            markers.close()
+
+        # Only close once every file is confirmed on disk
+        saving_stim.draw()
+        win.flip()
+        failed = writer.close()
+        if failed:
+            logging.error(f"Failed to save: {failed}")
+
+        win.close()
+        core.quit()
+    return run
+
+phase_builders = {
+    'instruction': build_instruction,
+    'training_demo_1': build_training_demo_1,
+    'training_demo_2': build_training_demo_2,
+    'nback_test': build_nback_test,
+    'passages': build_passages,
+    'demographics': build_demographics,
+    'export': build_export,
+    'finish': build_finish,
+}
+
+# === COMPILE & RUN ===
+timeline = load_timeline(timeline_path)
+footer_stims = {
+    name: visual.TextStim(win, text=text, pos=(0, -300), height=22, alignText='center', color='white', wrapWidth=800)
+    for name, text in timeline.get('footers', {}).items()
+}
+
+session_graph = compile_timeline(timeline, phase_builders)
+for line in session_graph.report():
+    logging.info(f"timeline: {line}")
+
+session_graph.run()
@@ -0,0 +1,143 @@
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from item_bank import ItemBank, difficulty_suffixes
+
+
+# === READING-TIME & COMPREHENSION ANALYTICS ===
+# Usage: python analytics.py [data_folder] [passages.xlsx]
+# Reads every session's _passagedata.csv in one pass, joins page RTs to the
+# word/character counts of the page that was on screen and writes summaries
+# to <data_folder>/analytics/.
+
+skim_wpm = 600  # faster than this is treated as skimming, not reading
+outlier_mad = 3.5  # robust z-score cut-off on log reading speed
+
+# Participant ID % 4 -> n-back modality (see condition assignment in the task script)
+modality_by_remainder = {1: 'letter', 2: 'letter', 3: 'audio', 0: 'audio'}
+
+
+# === PAGE WORD & CHARACTER COUNTS ===
+def page_counts(passages_path="passages.xlsx"):
+    bank = ItemBank(passages_path)
+    counts = pd.DataFrame(
+        [(item.item_id, item.topic, difficulty, page_num, text)
+         for difficulty in difficulty_suffixes for item in bank.items(difficulty)
+         for page_num, text in enumerate(item.pages, start=1)],
+        columns=['item_id', 'topic', 'condition', 'page', 'text'])
+
+    text = counts['text'].astype(str)
+    counts['words'] = text.str.split().str.len()
+    counts['chars'] = text.str.len()
+    return counts[['item_id', 'topic', 'condition', 'page', 'words', 'chars']]
+
+
+# === LOAD SESSIONS ===
+# File names are {ppt_id}-{remainder}-{date}_passagedata.csv
+def load_sessions(data_folder="data/"):
+    paths = sorted(glob.glob(os.path.join(data_folder, '*_passagedata.csv')))
+    if not paths:
+        return pd.DataFrame()
+
+    frames = []
+    for path in paths:
+        frame = pd.read_csv(path, dtype={'question_num': str})
+        frame['session'] = os.path.basename(path).removesuffix('_passagedata.csv')
+        frames.append(frame)
+    sessions = pd.concat(frames, ignore_index=True)
+
+    remainder = sessions['session'].str.split('-', n=2).str[1].astype(int)
+    sessions['modality'] = remainder.map(modality_by_remainder)
+    sessions['topic'] = sessions['topic'].astype(str)
+    return sessions
+
+
+# === READING SPEED ===
+def reading_speed(sessions, counts):
+    pages = sessions[sessions['question_num'] == 'passage'].copy()
+
+    # Sessions recorded before the 'page' column existed list pages in order
+    page_order = pages.groupby(['session', 'trial']).cumcount() + 1
+    if 'page' in pages.columns:
+        pages['page'] = pages['page'].fillna(page_order)
+    else:
+        pages['page'] = page_order
+    pages['page'] = pages['page'].astype(int)
+
+    # Pages are matched to their passage by item_id. Sessions recorded before
+    # item ids existed fall back to the topic, but only where the topic has a
+    # single passage in that condition (otherwise the page is left unmatched).
+    if 'item_id' not in pages.columns:
+        pages['item_id'] = np.nan
+    pages = pages.merge(counts[['item_id', 'page', 'words', 'chars']], on=['item_id', 'page'], how='left')
+
+    unmatched = pages['words'].isna()
+    if unmatched.any():
+        by_topic = counts.drop_duplicates(['topic', 'condition', 'page'], keep=False)
+        fallback = pages.loc[unmatched, ['topic', 'condition', 'page']].merge(
+            by_topic, on=['topic', 'condition', 'page'], how='left')
+        pages.loc[unmatched, ['words', 'chars']] = fallback[['words', 'chars']].to_numpy()
+
+    minutes = pages['reaction_time'] / 60
+    pages['wpm'] = pages['words'] / minutes
+    pages['chars_per_sec'] = pages['chars'] / pages['reaction_time']
+
+    # Robust z of log speed within each difficulty condition
+    log_wpm = np.log(pages['wpm'])
+    median = log_wpm.groupby(pages['condition']).transform('median')
+    mad = (log_wpm - median).abs().groupby(pages['condition']).transform('median') * 1.4826
+    pages['speed_z'] = (log_wpm - median) / mad.replace(0, np.nan)
+    pages['skim'] = pages['wpm'] > skim_wpm
+    pages['outlier'] = pages['speed_z'].abs() > outlier_mad
+    return pages
+
+
+# === SUMMARIES ===
+def comprehension_accuracy(sessions):
+    questions = sessions[sessions['question_num'].isin(['1', '2'])].copy()
+    questions['is_correct'] = questions['is_correct'].astype(str) == 'True'
+    return (questions.groupby(['condition', 'modality'])
+            .agg(n_answers=('is_correct', 'size'),
+                 accuracy=('is_correct', 'mean'),
+                 median_rt=('reaction_time', 'median'))
+            .reset_index())
+
+
+def speed_summary(pages):
+    clean = pages[~pages['outlier']]
+    return (pages.groupby(['condition', 'modality'])
+            .agg(n_pages=('wpm', 'size'),
+                 median_wpm=('wpm', 'median'),
+                 skim_rate=('skim', 'mean'),
+                 outlier_rate=('outlier', 'mean'))
+            .join(clean.groupby(['condition', 'modality'])['wpm'].mean().rename('mean_wpm_clean'))
+            .reset_index())
+
+
+def main(data_folder="data/", passages_path="passages.xlsx"):
+    sessions = load_sessions(data_folder)
+    if sessions.empty:
+        print(f"No _passagedata.csv files found in {data_folder}")
+        return
+
+    pages = reading_speed(sessions, page_counts(passages_path))
+    out_folder = os.path.join(data_folder, 'analytics')
+    os.makedirs(out_folder, exist_ok=True)
+
+    pages.to_csv(os.path.join(out_folder, 'page_reading.csv'), index=False)
+    speed = speed_summary(pages)
+    speed.to_csv(os.path.join(out_folder, 'reading_speed_summary.csv'), index=False)
+    accuracy = comprehension_accuracy(sessions)
+    accuracy.to_csv(os.path.join(out_folder, 'comprehension_summary.csv'), index=False)
+
+    print(speed.to_string(index=False))
+    print()
+    print(accuracy.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
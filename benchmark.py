@@ -0,0 +1,241 @@
+import argparse
+import io
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+from item_bank import ItemBank, shuffle_options, question_text
+from nback import generate_targets, generate_stim_list, correct_response, score_response
+from records import TrialStore, nback_fields, passage_fields
+from export import build_frame
+
+
+# === MICRO-BENCHMARKS FOR THE TASK'S CORE ROUTINES ===
+# Usage: python benchmark.py            compare against this machine's baseline
+#        python benchmark.py --update   rewrite this machine's baseline
+# Runs the task's pure logic without a display, on passages.xlsx and
+# synthetic sessions. Timings only compare on the same machine, so each
+# station's baseline is committed as benchmark_baselines/<hostname>.json (like
+# the calibration profiles). A routine with no baseline fails the run.
+#
+# Each routine is timed in several rounds, interleaved with the other
+# routines, and reports the median time per call. Its noise is the
+# interquartile range of the rounds relative to the median. The run fails
+# (exit code 1) if a routine's median exceeds baseline * (time_threshold +
+# noise), using the larger noise of the baseline and the current run, or if
+# its peak traced memory exceeds baseline * memory_threshold.
+
+baseline_folder = 'benchmark_baselines'
+passages_path = 'passages.xlsx'
+time_threshold = 1.5
+memory_threshold = 1.5
+rounds = 7
+min_sample_seconds = 0.5  # each round times enough calls to fill this
+min_noise = 0.1  # noise floor for routines that measured steadier than this
+
+# Synthetic sessions: 5 blocks x 10 trials after the n_back fillers, a longer
+# session than prepare_test's single block so per-trial costs dominate
+n_back = 2
+total_blocks = 5
+letters = list("CGHKPQTW")
+
+
+# === FIXTURES ===
+def synthetic_session(rng):
+    stores = []
+    for section in ['train_1', 'train_2', 'pre', 'post']:
+        stim_list = generate_stim_list(generate_targets(n_back, total_blocks, rng=rng), n_back, letters, rng=rng)
+        store = TrialStore(len(stim_list), nback_fields,
+                           {'ppt_ID': 1, 'condition': 'letter_easy', 'section': section, 'calibration_id': 'bench'})
+        fill_nback_store(store, stim_list, rng)
+        stores.append(store)
+    return stores
+
+
+def fill_nback_store(store, stim_list, rng):
+    for i, letter in enumerate(stim_list):
+        response = rng.choice(['k', 'd', None])
+        rt = rng.uniform(0.3, 2.0) if response else None
+        store[i, 'trial'] = i + 1
+        store[i, 'stim'] = letter
+        store[i, 'is_target'] = correct_response(stim_list, i, n_back) == 'k'
+        store[i, 'response'] = response
+        store[i, 'rt'] = rt
+        store[i, 'rt_corrected'] = rt
+        store[i, 'correct'] = score_response(response, correct_response(stim_list, i, n_back))
+        store[i, 'marker_time'] = float(i)
+
+
+def passage_store(bank, rng):
+    passages = bank.sample('easy', 3, rng=rng)
+    store = TrialStore(1 + sum(len(item.pages) + len(item.questions) for item in passages), passage_fields,
+                       {'participant': 1, 'calibration_id': 'bench', 'condition': 'easy'})
+    for idx, item in enumerate(passages):
+        for page_num in range(1, len(item.pages) + 1):
+            row = store.next_row()
+            store[row, 'topic'] = item.topic
+            store[row, 'trial'] = idx + 1
+            store[row, 'page'] = page_num
+            store[row, 'reaction_time'] = rng.uniform(5, 40)
+        for q in item.questions:
+            options, correct_key = shuffle_options(q, rng)
+            row = store.next_row()
+            store[row, 'question'] = q.text
+            store[row, 'correct_key'] = correct_key
+            for i, opt in enumerate(options):
+                store[row, f'option_{i+1}'] = opt
+    return store
+
+
+# === BENCHMARKS ===
+# Each returns a zero-argument callable; setup cost is kept out of the timing.
+def bench_sequence_generation():
+    rng = random.Random(0)
+    return lambda: generate_stim_list(generate_targets(n_back, total_blocks, rng=rng), n_back, letters, rng=rng)
+
+
+def bench_scoring():
+    rng = random.Random(0)
+    stim_list = generate_stim_list(generate_targets(n_back, total_blocks, rng=rng), n_back, letters, rng=rng)
+    responses = [rng.choice(['k', 'd', None]) for _ in stim_list]
+
+    def run():
+        return [score_response(responses[i], correct_response(stim_list, i, n_back)) for i in range(len(stim_list))]
+    return run
+
+
+def bench_question_screens():
+    bank = ItemBank(passages_path)
+    questions = [q for difficulty in ['easy', 'difficult'] for item in bank.items(difficulty) for q in item.questions]
+    rng = random.Random(0)
+
+    def run():
+        for q in questions:
+            options, _ = shuffle_options(q, rng)
+            question_text(q, options)
+    return run
+
+
+def bench_passage_loading():
+    return lambda: ItemBank(passages_path).sample('difficult', 3)
+
+
+def bench_trial_store_fill():
+    rng = random.Random(0)
+    stim_list = generate_stim_list(generate_targets(n_back, total_blocks, rng=rng), n_back, letters, rng=rng)
+
+    def run():
+        store = TrialStore(len(stim_list), nback_fields, {'ppt_ID': 1, 'section': 'pre'})
+        fill_nback_store(store, stim_list, rng)
+    return run
+
+
+# Builds the export frame and CSV text in memory. The durable write's fsyncs
+# measure the disk, not this code, so they are left out.
+def bench_export_nback():
+    stores = synthetic_session(random.Random(0))
+    return lambda: build_frame(stores).to_csv(io.StringIO(), index=False)
+
+
+def bench_export_passages():
+    store = passage_store(ItemBank(passages_path), random.Random(0))
+    return lambda: build_frame([store]).to_csv(io.StringIO(), index=False)
+
+
+benchmarks = {
+    'sequence_generation': bench_sequence_generation,
+    'scoring': bench_scoring,
+    'question_screens': bench_question_screens,
+    'passage_loading': bench_passage_loading,
+    'trial_store_fill': bench_trial_store_fill,
+    'export_nback': bench_export_nback,
+    'export_passages': bench_export_passages,
+}
+
+
+def baseline_path():
+    return os.path.join(baseline_folder, f"{socket.gethostname()}.json")
+
+
+def measure(names):
+    timers = {}
+    for name in names:
+        run = benchmarks[name]()
+        run()  # warm up caches and lazy imports before timing
+        timer = timeit.Timer(run)
+        number, elapsed = timer.autorange()
+        timers[name] = (run, timer, max(number, math.ceil(number * min_sample_seconds / elapsed)))
+
+    # Interleaved, so a slow spell on the machine is spread over every routine
+    samples = {name: [] for name in names}
+    for _ in range(rounds):
+        for name, (_, timer, number) in timers.items():
+            samples[name].append(timer.timeit(number) / number)
+
+    results = {}
+    for name, (run, _, _) in timers.items():
+        seconds = statistics.median(samples[name])
+        q1, _, q3 = statistics.quantiles(samples[name], n=4)
+
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {'seconds': seconds, 'noise': (q3 - q1) / seconds, 'peak_bytes': peak}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the task logic')
+    parser.add_argument('--update', action='store_true', help="write the current results as this machine's baseline")
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), help='run a subset')
+    args = parser.parse_args()
+
+    path = baseline_path()
+    baseline = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baseline = json.load(f)
+
+    results = measure(args.only or list(benchmarks))
+    regressions = []
+    for name, result in results.items():
+        line = f"{name:<22} {result['seconds'] * 1e6:>12.1f} us  ±{result['noise']:>4.0%} {result['peak_bytes'] / 1024:>10.1f} KiB"
+        if name in baseline:
+            time_ratio = result['seconds'] / baseline[name]['seconds']
+            time_limit = time_threshold + max(baseline[name]['noise'], result['noise'], min_noise)
+            memory_ratio = result['peak_bytes'] / max(baseline[name]['peak_bytes'], 1)
+            line += f"   x{time_ratio:.2f} time (limit x{time_limit:.2f})  x{memory_ratio:.2f} memory"
+            if time_ratio > time_limit or memory_ratio > memory_threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.update:
+        baseline.update(results)
+        os.makedirs(baseline_folder, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {path}")
+        return 0
+
+    # Without a baseline nothing was checked, which must not pass as green
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f"No baseline on this machine for: {', '.join(missing)}")
+        print(f"Run with --update to create {path} and commit it")
+        return 1
+    if regressions:
+        print(f"Regressed beyond threshold: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import json
+import os
+import socket
+import sys
+from datetime import datetime
+
+import numpy as np
+
+
+# === PER-STATION HARDWARE CALIBRATION ===
+# Usage: python calibration.py [screen]
+# Measures the frame interval distribution, audio output latency and keyboard
+# latency once per station and saves them as a JSON profile keyed by hostname
+# and screen. Sessions load the profile without measuring anything.
+# Bump profile_version when the measurements change; older profiles are
+# then ignored until the station is recalibrated.
+
+profile_version = 1
+profile_folder = 'calibration'
+n_frames = 600
+n_sounds = 20
+n_keypresses = 20
+
+
+def station_key(screen=0):
+    return f"{socket.gethostname()}_screen{screen}"
+
+
+def profile_path(screen=0):
+    return os.path.join(profile_folder, f"{station_key(screen)}.json")
+
+
+# Returns None when the station has no (current) profile
+def load_profile(screen=0):
+    path = profile_path(screen)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get('version') != profile_version:
+        return None
+    return profile
+
+
+def save_profile(profile, screen=0):
+    os.makedirs(profile_folder, exist_ok=True)
+    with open(profile_path(screen), 'w') as f:
+        json.dump(profile, f, indent=2)
+
+
+def profile_id(profile):
+    return profile['profile_id'] if profile else 'uncalibrated'
+
+
+# === CONVERSIONS USED BY THE TASK ===
+# Without a profile the task passes the refresh rate it measured at startup
+# as fallback_interval. With neither, frames_for() returns None and callers
+# wait in time instead of counting frames.
+def frame_interval(profile, fallback_interval=None):
+    return profile['frame_interval_median'] if profile else fallback_interval
+
+
+def frames_for(duration, profile, fallback_interval=None):
+    interval = frame_interval(profile, fallback_interval)
+    if interval is None:
+        return None
+    return max(1, int(round(duration / interval)))
+
+
+# A duration rounded to whole frames, for waits that poll keys in time
+# (event.waitKeys) instead of flipping, so RTs keep millisecond timestamps
+def frame_locked(duration, profile, fallback_interval=None):
+    n_frames = frames_for(duration, profile, fallback_interval)
+    if n_frames is None:
+        return duration
+    return n_frames * frame_interval(profile, fallback_interval)
+
+
+# RTs are timed from the flip. Subtract the keyboard latency and, for audio
+# trials, the delay between play() (called on the flip) and the sound
+# actually starting. Only measured latencies are applied; older profiles
+# timed the play() call instead and are not applied for audio.
+def correct_rt(rt, profile, audio=False):
+    if rt is None or not profile:
+        return rt
+    corrected = rt
+    if profile.get('input_latency_method') != 'not_measured':
+        corrected -= profile['input_latency']
+    if audio and profile.get('audio_latency_method') == 'ptb_predicted_latency':
+        corrected -= profile['audio_latency']
+    return corrected
+
+
+# === MEASUREMENTS ===
+def measure_frames(win):
+    win.recordFrameIntervals = True
+    win.frameIntervals = []
+    for _ in range(n_frames):
+        win.flip()
+    win.recordFrameIntervals = False
+    intervals = np.array(win.frameIntervals[1:])
+    return {
+        'frame_interval_median': float(np.median(intervals)),
+        'frame_interval_mean': float(intervals.mean()),
+        'frame_interval_sd': float(intervals.std()),
+        'frame_interval_p99': float(np.percentile(intervals, 99)),
+        'dropped_frame_rate': float((intervals > 1.5 * np.median(intervals)).mean()),
+        'refresh_hz': float(1 / np.median(intervals)),
+    }
+
+
+# Uses the latency the PTB audio stream reports for each onset, i.e. the
+# delay from the play() call to the sound starting. Other audio backends
+# report no latency, and the station is recorded as not measured.
+def measure_audio(sound_path):
+    from psychopy import core, sound
+
+    snd = sound.Sound(sound_path)
+    latencies = []
+    for _ in range(n_sounds):
+        snd.play()
+        status = getattr(getattr(snd, 'stream', None), 'status', None)
+        if not (isinstance(status, dict) and 'PredictedLatency' in status):
+            snd.stop()
+            print("Audio backend reports no output latency: audio latency not measured")
+            return {'audio_latency': 0.0, 'audio_latency_method': 'not_measured'}
+        latencies.append(status['PredictedLatency'])
+        core.wait(snd.getDuration() + 0.1)
+        snd.stop()
+    return {'audio_latency': float(np.median(latencies)), 'audio_latency_method': 'ptb_predicted_latency'}
+
+
+# The operator presses SPACE repeatedly. Each press is timestamped by the
+# hardware keyboard queue and by event.getKeys (what the task uses); the
+# difference is the extra latency of the task's key handling. Only the PTB
+# keyboard backend keeps its own queue alongside event.getKeys, so other
+# backends are not measured. ESCAPE ends the measurement early.
+def measure_input(win):
+    from psychopy import core, event, visual
+    from psychopy.hardware import keyboard
+
+    not_measured = {'input_latency': 0.0, 'input_latency_sd': None, 'input_latency_method': 'not_measured'}
+    kb = keyboard.Keyboard()
+    backend = kb.getBackend()
+    if backend != 'ptb':
+        print(f"Keyboard backend is {backend!r}, not 'ptb': input latency not measured")
+        return not_measured
+
+    # event.getKeys stamps presses relative to monotonicClock's last reset;
+    # Keyboard.tDown is absolute PTB GetSecs(). This is the offset between them.
+    polled_zero = core.monotonicClock.getLastResetTime()
+
+    prompt = visual.TextStim(win, color='white', height=28)
+    polled, hardware, lags = [], [], []
+    event.clearEvents()
+    kb.clearEvents()
+    while len(lags) < n_keypresses:
+        prompt.text = f"Press [SPACE] {n_keypresses - len(lags)} more times"
+        prompt.draw()
+        win.flip()
+        keys = event.getKeys(keyList=['space', 'escape'], timeStamped=core.monotonicClock)
+        if any(key == 'escape' for key, _ in keys):
+            break
+        polled += [t for _, t in keys]
+        hardware += [key.tDown for key in kb.getKeys(keyList=['space'], waitRelease=False)]
+        lags = match_presses(polled, hardware, polled_zero)
+
+    if not lags:
+        return not_measured
+    return {'input_latency': float(np.median(lags)), 'input_latency_sd': float(np.std(lags)),
+            'input_latency_method': 'ptb_keyboard'}
+
+
+# Pairs each polled press with the hardware press just before it (within
+# max_lag), so a press seen by only one queue does not shift later pairs.
+# Polled times are relative to polled_zero on the hardware clock.
+def match_presses(polled, hardware, polled_zero=0.0, max_lag=0.2):
+    hardware = sorted(hardware)
+    lags = []
+    j = 0
+    for t in sorted(polled_zero + t for t in polled):
+        while j < len(hardware) and hardware[j] < t - max_lag:
+            j += 1
+        if j < len(hardware) and hardware[j] <= t:
+            lags.append(t - hardware[j])
+            j += 1
+    return lags
+
+
+def main(screen=0):
+    from psychopy import visual
+
+    win = visual.Window(monitor="testMonitor", fullscr=True, color='grey', units='pix', screen=screen)
+    profile = {
+        'version': profile_version,
+        'hostname': socket.gethostname(),
+        'screen': screen,
+        'resolution': [int(v) for v in win.size],
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    profile.update(measure_frames(win))
+    profile.update(measure_audio(os.path.join("audio-alphabet", "C.wav")))
+    profile.update(measure_input(win))
+    profile['profile_id'] = f"{station_key(screen)}-v{profile_version}-{datetime.now().strftime('%Y%m%d%H%M')}"
+    win.close()
+
+    save_profile(profile, screen)
+    print(json.dumps(profile, indent=2))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
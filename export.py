@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from records import TrialStore, concat_frames
+
+
+# === BACKGROUND SESSION EXPORT ===
+# Data files are built and written on a single worker thread so the
+# participant-facing flow continues straight away. Each file is written to a
+# temporary path, fsync'd and renamed into place (then the folder is fsync'd),
+# so a file that exists is complete. close() is the completion handshake: it
+# blocks until every queued write is on disk and returns the paths that failed.
+
+# records: list of TrialStores (concatenated column-wise) or list of row dicts
+def build_frame(records):
+    if records and all(isinstance(r, TrialStore) for r in records):
+        return concat_frames(records)
+    return pd.DataFrame(records)
+
+
+def write_csv_durable(records, path):
+    df = build_frame(records)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path) or '.')
+    return path
+
+
+# The rename is only durable once the directory entry is on disk. Windows
+# cannot open directories for fsync; there the rename is not synced.
+def fsync_dir(folder):
+    if os.name != 'posix':
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BackgroundWriter:
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+        self._pending = []
+
+    # The list is copied so the caller can keep appending to its own
+    def write_csv(self, records, path):
+        future = self._executor.submit(write_csv_durable, list(records), path)
+        self._pending.append((path, future))
+        return future
+
+    def close(self):
+        failed = []
+        for path, future in self._pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Export error for {path}: {e}")
+                failed.append(path)
+        self._pending = []
+        self._executor.shutdown(wait=True)
+        return failed
@@ -0,0 +1,147 @@
+import hashlib
+import random
+from collections import namedtuple
+
+import pandas as pd
+
+
+# === PASSAGE ITEM BANK ===
+# The workbook has one row per passage topic. Each difficulty level is a block
+# of columns that repeats the same names, and pandas suffixes the repeats
+# ('Field1' for easy, 'Field1.1' for difficult, and so on for further levels).
+# Adding a difficulty level means adding a column block and an entry here.
+difficulty_suffixes = {'easy': '', 'difficult': '.1'}
+
+# Optional workbook column with a stable id per row. Without it, ids are the
+# topic plus a hash of the item's text, so they stay the same when rows are
+# inserted or reordered (and change only if the passage itself is edited).
+id_col = 'Item_ID'
+
+page_cols = ['Field1', 'Field2', 'Field3']
+question_nums = [1, 2]
+n_options = 4
+
+Question = namedtuple('Question', ['qnum', 'text', 'correct_answer', 'distractors'])
+PassageItem = namedtuple('PassageItem', ['item_id', 'topic', 'difficulty', 'pages', 'questions'])
+
+
+def load_workbook(path):
+    df = pd.read_excel(path, header=1)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+class ItemBank:
+    # Only the topic index is built up front. Compact PassageItem records are
+    # built from the workbook the first time an item is sampled and then cached.
+    def __init__(self, path):
+        self._df = load_workbook(path)
+        self._items = {}
+        self._index = {difficulty: {} for difficulty in difficulty_suffixes}
+        self._topics = {}
+        self._n_items = {}
+
+        topics = self._df['Topic'].astype(str).str.strip()
+        for difficulty, suffix in difficulty_suffixes.items():
+            cols = [col + suffix for col in page_cols if col + suffix in self._df.columns]
+            if not cols:
+                continue
+            has_pages = self._df[cols].notna().any(axis=1)
+            for row_pos in has_pages[has_pages].index:
+                self._index[difficulty].setdefault(topics[row_pos], []).append(row_pos)
+
+        for difficulty, by_topic in self._index.items():
+            self._topics[difficulty] = list(by_topic)
+            self._n_items[difficulty] = sum(len(rows) for rows in by_topic.values())
+
+    def topics(self, difficulty):
+        return list(self._topics[difficulty])
+
+    def __len__(self):
+        return sum(self._n_items.values())
+
+    def items(self, difficulty):
+        return [self.get(row_pos, difficulty) for rows in self._index[difficulty].values() for row_pos in rows]
+
+    def get(self, row_pos, difficulty):
+        key = (row_pos, difficulty)
+        if key not in self._items:
+            self._items[key] = self._build_item(row_pos, difficulty)
+        return self._items[key]
+
+    def _build_item(self, row_pos, difficulty):
+        suffix = difficulty_suffixes[difficulty]
+        row = self._df.iloc[row_pos]
+
+        pages = tuple(str(row[col + suffix]) for col in page_cols
+                      if col + suffix in row.index and not pd.isna(row[col + suffix]))
+
+        questions = []
+        for qnum in question_nums:
+            prefix = f'Comprehension_Q{qnum}'
+            questions.append(Question(
+                qnum=qnum,
+                text=str(row[prefix + suffix]),
+                correct_answer=str(row[f'{prefix}_Option_1_answer{suffix}']),
+                distractors=tuple(str(row[f'{prefix}_Option_{i}{suffix}']) for i in range(2, n_options + 1))
+            ))
+
+        topic = str(row['Topic'])
+        if id_col in row.index and not pd.isna(row[id_col]):
+            stable_id = str(row[id_col]).strip()
+        else:
+            stable_id = f"{'-'.join(topic.lower().split())}-{content_hash(pages, questions)}"
+
+        return PassageItem(
+            item_id=f'{stable_id}-{difficulty}',
+            topic=topic,
+            difficulty=difficulty,
+            pages=pages,
+            questions=tuple(questions)
+        )
+
+    # Balanced sample without repeats: topics are drawn without replacement
+    # (a fresh shuffle of the topics that still have unused items once every
+    # topic has been used), then one unused item per topic. Topic lists and
+    # item counts are cached when the bank is loaded.
+    def sample(self, difficulty, n_items, rng=random):
+        if n_items > self._n_items[difficulty]:
+            raise ValueError(f"Asked for {n_items} {difficulty} passages, but the bank has "
+                             f"only {self._n_items[difficulty]}")
+
+        by_topic = self._index[difficulty]
+        open_topics = self._topics[difficulty]
+        chosen = []
+        taken = {}
+        while len(chosen) < n_items:
+            for topic in rng.sample(open_topics, min(len(open_topics), n_items - len(chosen))):
+                used = taken.setdefault(topic, set())
+                row_pos = rng.choice([row for row in by_topic[topic] if row not in used])
+                used.add(row_pos)
+                chosen.append(self.get(row_pos, difficulty))
+            open_topics = [topic for topic in open_topics if len(taken.get(topic, ())) < len(by_topic[topic])]
+        return chosen
+
+
+def content_hash(pages, questions):
+    parts = list(pages)
+    for q in questions:
+        parts += [q.text, q.correct_answer, *q.distractors]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()[:8]
+
+
+# === COMPREHENSION QUESTION SCREENS ===
+# Options are shown in random order; the correct key is the 1-based position
+# of the correct answer.
+def shuffle_options(question, rng=random):
+    options = [question.correct_answer] + list(question.distractors)
+    rng.shuffle(options)
+    correct_key = str(options.index(question.correct_answer) + 1)
+    return options, correct_key
+
+
+def question_text(question, options):
+    full_text = f"{question.text}\n\n"
+    for i, opt in enumerate(options):
+        full_text += f"{i+1}. {opt}\n"
+    return full_text
@@ -0,0 +1,139 @@
+import socket
+import sys
+import time
+
+
+# === EVENT MARKERS FOR PHYSIOLOGICAL RECORDERS ===
+# Markers are small UDP datagrams sent on a socket that is opened once and
+# set non-blocking, so a send never waits on the network. The task sends
+# them from win.callOnFlip(), i.e. right after the frame they mark has been
+# flipped, and writes the send time into the trial data.
+#
+# Datagrams (ASCII, comma separated):
+#   marker  M,<seq>,<send time>,<code>
+#   sync    S,<seq>,<send time>             -> reply S,<seq>,<send time>,<receiver time>
+#
+# Between timed blocks sync() exchanges a few pings with the receiver and
+# keeps the offset (receiver clock - task clock) from the fastest round trip.
+#
+# Usage (stand-in recorder that prints markers and answers syncs):
+#   python markers.py [port]
+
+default_port = 5005
+
+
+class MarkerSender:
+    # address: (host, port), or None to disable markers
+    def __init__(self, address=None, clock=time.perf_counter):
+        self.address = address
+        self.clock = clock
+        self.seq = 0
+        self.dropped = 0
+        self.lost_pings = 0
+        self.sync_log = []
+        self._sock = None
+        if address is not None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+
+    @property
+    def enabled(self):
+        return self._sock is not None
+
+    # Optionally writes the send time into store[row, column] (see records.py)
+    def send(self, code, store=None, row=None, column='marker_time'):
+        if self._sock is None:
+            return None
+        self.seq += 1
+        t = self.clock()
+        try:
+            self._sock.sendto(f"M,{self.seq},{t:.6f},{code}".encode(), self.address)
+        except (BlockingIOError, OSError):
+            self.dropped += 1
+            return None
+        if store is not None:
+            store[row, column] = t
+        return t
+
+    # Only call between timed blocks: this waits for replies
+    def sync(self, label='', n_pings=5, timeout=0.05):
+        if self._sock is None:
+            return None
+        best = None
+        self._sock.settimeout(timeout)
+        try:
+            for _ in range(n_pings):
+                self.seq += 1
+                t0 = self.clock()
+                try:
+                    self._sock.sendto(f"S,{self.seq},{t0:.6f}".encode(), self.address)
+                    while True:
+                        reply = self._sock.recv(256).decode().split(',')
+                        if reply[0] == 'S' and int(reply[1]) == self.seq:
+                            break
+                except OSError:
+                    # Timeout, or no recorder listening (refused on Linux,
+                    # ConnectionResetError / WinError 10054 on Windows)
+                    self.lost_pings += 1
+                    continue
+                t2 = self.clock()
+                rtt = t2 - t0
+                offset = float(reply[3]) - (t0 + t2) / 2
+                if best is None or rtt < best['rtt']:
+                    best = {'label': label, 'task_time': t2, 'offset': offset, 'rtt': rtt}
+        finally:
+            self._sock.setblocking(False)
+        if best is not None:
+            self.sync_log.append(best)
+        return best
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+# === STAND-IN RECEIVER ===
+class MarkerReceiver:
+    def __init__(self, port=default_port, host='127.0.0.1', clock=time.perf_counter):
+        self.clock = clock
+        self.markers = []
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self.address = self._sock.getsockname()
+
+    # Handles one datagram; returns the marker tuple or None for syncs/timeouts
+    def poll(self, timeout=None):
+        self._sock.settimeout(timeout)
+        try:
+            data, sender = self._sock.recvfrom(1024)
+        except socket.timeout:
+            return None
+        received = self.clock()
+        fields = data.decode().split(',', 3)
+        if fields[0] == 'S':
+            self._sock.sendto(f"{data.decode()},{received:.6f}".encode(), sender)
+            return None
+        marker = (int(fields[1]), float(fields[2]), fields[3], received)
+        self.markers.append(marker)
+        return marker
+
+    def close(self):
+        self._sock.close()
+
+
+def main(port=default_port):
+    receiver = MarkerReceiver(port, host='0.0.0.0')
+    print(f"Listening for markers on port {port}")
+    try:
+        while True:
+            marker = receiver.poll()
+            if marker is not None:
+                seq, sent, code, received = marker
+                print(f"{received:.6f}  #{seq}  {code}")
+    except KeyboardInterrupt:
+        receiver.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else default_port)
@@ -0,0 +1,46 @@
+import random
+
+
+# === N-BACK SEQUENCE & SCORING ===
+# Shared by the task script (prepare_test) and the design simulator (simulate.py).
+
+# Each block of trials_per_block trials holds targets_per_block targets in
+# random order, preceded once by n_back filler trials that cannot be targets.
+def generate_targets(n_back, total_blocks, trials_per_block=10, targets_per_block=3, rng=random):
+    sequence = []
+    sequence.extend([0]*n_back)
+    for _ in range(total_blocks):
+        block = [1]*targets_per_block + [0]*(trials_per_block - targets_per_block)
+        rng.shuffle(block)
+        sequence.extend(block)
+    return sequence
+
+
+# Targets repeat the letter n_back trials back; non-targets never do.
+def generate_stim_list(sequence, n_back, letters, rng=random):
+    stim_list = []
+    for i, is_target in enumerate(sequence):
+        if i < n_back:
+            stim_list.append(rng.choice(letters))
+        else:
+            if is_target:
+                stim_list.append(stim_list[i - n_back])
+            else:
+                non_match = rng.choice(letters)
+                while non_match == stim_list[i - n_back]:
+                    non_match = rng.choice(letters)
+                stim_list.append(non_match)
+    return stim_list
+
+
+def is_target(stim_list, i, n_back):
+    return i >= n_back and stim_list[i] == stim_list[i - n_back]
+
+
+def correct_response(stim_list, i, n_back):
+    return 'k' if is_target(stim_list, i, n_back) else 'd'
+
+
+# No response (timeout) is scored None, not False
+def score_response(response_key, correct_key):
+    return (response_key == correct_key) if response_key else None
@@ -0,0 +1,89 @@
+import gc
+import os
+import time
+from contextlib import contextmanager
+
+from psychopy import core, logging
+
+
+# === REAL-TIME MODE FOR TIMED BLOCKS ===
+# Opt-in. While a timed block runs, automatic garbage collection is switched
+# off (the pending collection happens once the block ends), process priority
+# is raised with core.rush() and the process can be pinned to one CPU core.
+# Normal behaviour is restored between blocks. Anything that could still
+# disturb timing during a block is written to the PsychoPy log.
+
+class RealtimeMode:
+    def __init__(self, enabled=False, cpu=None):
+        self.enabled = enabled
+        self.cpu = cpu
+        self._block = None
+        self._gc_start = None
+        self._saved_affinity = None
+
+    # gc callback: a collection that runs inside a block (e.g. an explicit
+    # gc.collect() from a library) is a timing spike worth reporting
+    def _on_gc(self, phase, info):
+        if self._block is None:
+            return
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            pause_ms = (time.perf_counter() - self._gc_start) * 1000
+            self._gc_start = None
+            logging.warning(f"realtime [{self._block}]: GC pause {pause_ms:.2f} ms "
+                            f"(generation {info['generation']}, collected {info['collected']})")
+
+    def _pin_cpu(self):
+        if self.cpu is None:
+            return
+        try:
+            self._saved_affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, {self.cpu})
+        except (AttributeError, OSError) as e:
+            self._saved_affinity = None
+            logging.warning(f"realtime [{self._block}]: could not pin to CPU {self.cpu}: {e}")
+
+    def _unpin_cpu(self):
+        saved, self._saved_affinity = self._saved_affinity, None
+        if saved is not None:
+            os.sched_setaffinity(0, saved)
+
+    # Restore steps run independently, so one failing step (e.g. the affinity
+    # call) cannot leave GC disabled for the rest of the session
+    def _restore(self, name, what, step):
+        try:
+            step()
+        except Exception as e:
+            logging.error(f"realtime [{name}]: could not restore {what}: {e}")
+
+    @contextmanager
+    def block(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        self._block = name
+        gc.collect()
+        gc.freeze()  # objects built during setup are never rescanned in the block
+        gc.disable()
+        gc.callbacks.append(self._on_gc)
+
+        if not core.rush(True):
+            logging.warning(f"realtime [{name}]: could not raise process priority")
+        self._pin_cpu()
+        logging.info(f"realtime [{name}]: entered")
+
+        try:
+            yield
+        finally:
+            self._restore(name, 'GC callback', lambda: gc.callbacks.remove(self._on_gc))
+            self._block = None
+            self._restore(name, 'automatic GC', gc.enable)
+            self._restore(name, 'GC freeze', gc.unfreeze)
+            self._restore(name, 'process priority', lambda: core.rush(False))
+            self._restore(name, 'CPU affinity', self._unpin_cpu)
+
+            t0 = time.perf_counter()
+            gc.collect()
+            logging.info(f"realtime [{name}]: exited, deferred GC took {(time.perf_counter() - t0) * 1000:.2f} ms")
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+
+# === COLUMNAR TRIAL RECORD STORE ===
+# A fixed number of rows is preallocated per section. Each column is one
+# typed array, and fields that are constant for the whole section (participant,
+# condition, section, ...) are held once and only broadcast on export. Trial
+# loops write by row index:
+#     store[i, 'rt'] = rt
+# Column kinds:
+#   'int'   int32, missing values masked   -> pandas Int32
+#   'float' float64, None stored as NaN
+#   'bool'  int8 with -1 for None          -> pandas boolean
+#   'str'   object array (text of any length, None allowed)
+
+missing_int = np.iinfo(np.int32).min
+
+# Columns of the task's stores; section constants are passed separately
+nback_fields = [
+    ('trial', 'int'),
+    ('stim', 'str'),
+    ('is_target', 'bool'),
+    ('response', 'str'),
+    ('rt', 'float'),
+    ('rt_corrected', 'float'),
+    ('correct', 'bool'),
+    ('marker_time', 'float'),
+]
+
+passage_fields = [
+    ('topic', 'str'),
+    ('item_id', 'str'),
+    ('trial', 'int'),
+    ('question_num', 'str'),
+    ('page', 'int'),
+    ('word_index', 'int'),
+    ('word', 'str'),
+    ('onset', 'float'),
+    ('response', 'str'),
+    ('correct_key', 'str'),
+    ('is_correct', 'bool'),
+    ('question', 'str'),
+    ('correct_answer', 'str'),
+    ('option_1', 'str'),
+    ('option_2', 'str'),
+    ('option_3', 'str'),
+    ('option_4', 'str'),
+    ('reaction_time', 'float'),
+    ('marker_time', 'float'),
+]
+
+
+class TrialStore:
+    def __init__(self, n_rows, fields, constants=None):
+        self.n_rows = n_rows
+        self.constants = dict(constants or {})
+        self.kinds = dict(fields)
+        self.columns = {}
+        for name, kind in fields:
+            if kind == 'int':
+                self.columns[name] = np.full(n_rows, missing_int, dtype=np.int32)
+            elif kind == 'float':
+                self.columns[name] = np.full(n_rows, np.nan)
+            elif kind == 'bool':
+                self.columns[name] = np.full(n_rows, -1, dtype=np.int8)
+            elif kind == 'str':
+                self.columns[name] = np.full(n_rows, None, dtype=object)
+            else:
+                raise ValueError(f"Unknown column kind {kind!r} for {name!r}")
+        self._cursor = 0
+
+    def __setitem__(self, key, value):
+        row, name = key
+        kind = self.kinds[name]
+        if value is None:
+            if kind == 'int':
+                value = missing_int
+            elif kind == 'bool':
+                value = -1
+        self.columns[name][row] = value
+
+    def __getitem__(self, key):
+        row, name = key
+        return self.columns[name][row]
+
+    def __len__(self):
+        return self.n_rows
+
+    # For event streams written in order (e.g. the passage section)
+    def next_row(self):
+        if self._cursor >= self.n_rows:
+            raise IndexError(f"TrialStore is full ({self.n_rows} rows)")
+        row = self._cursor
+        self._cursor += 1
+        return row
+
+    # Rows that were never written (cursor-based stores) are left out
+    def to_frame(self):
+        n = self._cursor or self.n_rows
+        data = dict(self.constants)
+        for name, values in self.columns.items():
+            values = values[:n]
+            kind = self.kinds[name]
+            if kind == 'int':
+                data[name] = pd.arrays.IntegerArray(values, values == missing_int)
+            elif kind == 'bool':
+                data[name] = pd.arrays.BooleanArray(values == 1, values < 0)
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    # Optional dependency: only needed for Arrow/Parquet export
+    def to_arrow(self):
+        import pyarrow as pa
+        return pa.Table.from_pandas(self.to_frame(), preserve_index=False)
+
+
+def concat_frames(stores):
+    return pd.concat([store.to_frame() for store in stores], ignore_index=True)
@@ -0,0 +1,99 @@
+import textwrap
+from collections import namedtuple
+
+
+# === SELF-PACED (MOVING-WINDOW) READING ===
+# Each passage page is shown with every word masked ('-' per letter, spaces
+# kept), and each key press reveals the next word. All layout work happens
+# before the section starts:
+#   - the page is wrapped into lines in a monospace font, so the position of
+#     every word can be computed from its line and column
+#   - the full page and the masked page are each one TextStim whose text never
+#     changes afterwards
+# Revealing a word then only needs three draws: the masked page, a background
+# patch over the current word, and the full page clipped to that word by a
+# stencil aperture (the window must be opened with allowStencil=True).
+
+mask_char = '-'
+
+Word = namedtuple('Word', ['index', 'text', 'pos', 'size'])
+SelfPacedPage = namedtuple('SelfPacedPage', ['full', 'masked', 'words'])
+
+
+def mask_text(text):
+    return ''.join(c if c.isspace() else mask_char for c in text)
+
+
+# Lines of at most chars_per_line characters, split only at spaces
+def wrap_lines(text, chars_per_line):
+    return textwrap.wrap(text, chars_per_line, break_long_words=False, break_on_hyphens=False)
+
+
+# Each word's centre and size (in the units of char_width) on wrapped lines
+def layout_words(lines, char_width, line_height, top_left):
+    left, top = top_left
+    words = []
+    for j, line in enumerate(lines):
+        col = 0
+        for w in line.split(' '):
+            if w:
+                pos = (left + (col + len(w) / 2) * char_width, top - (j + 0.5) * line_height)
+                # half a character of slack keeps glyph overhang inside the window
+                size = ((len(w) + 0.5) * char_width, line_height)
+                words.append(Word(len(words), w, pos, size))
+            col += len(w) + 1
+    return words
+
+
+# Character advance and line spacing of a monospace font, measured once
+def measure_font(win, font, height):
+    from psychopy import visual
+
+    probe = visual.TextStim(win, text='M' * 40, font=font, height=height)
+    char_width = probe.boundingBox[0] / 40
+    one_line = probe.boundingBox[1]
+    probe.text = 'M\nM'
+    line_height = probe.boundingBox[1] - one_line
+    return char_width, line_height
+
+
+def build_page(win, text, metrics, font, height, wrap_width, color='white'):
+    from psychopy import visual
+
+    char_width, line_height = metrics
+    chars_per_line = max(1, int(wrap_width // char_width))
+    lines = wrap_lines(text, chars_per_line)
+    top_left = (-wrap_width / 2, len(lines) * line_height / 2)
+    words = layout_words(lines, char_width, line_height, top_left)
+
+    joined = '\n'.join(lines)
+    # wrapWidth is generous so TextStim never re-wraps the lines laid out here
+    settings = dict(font=font, height=height, color=color, wrapWidth=wrap_width * 2,
+                    alignText='left', anchorHoriz='left', anchorVert='top', pos=top_left)
+    return SelfPacedPage(
+        full=visual.TextStim(win, text=joined, **settings),
+        masked=visual.TextStim(win, text=mask_text(joined), **settings),
+        words=words
+    )
+
+
+# One aperture and one patch are shared by every page
+def make_word_window(win, background='grey'):
+    from psychopy import visual
+
+    aperture = visual.Aperture(win, size=(1, 1), shape='square', units='pix')
+    aperture.disable()
+    patch = visual.Rect(win, width=1, height=1, fillColor=background, lineColor=background, units='pix')
+    return aperture, patch
+
+
+def draw_word(page, word, aperture, patch):
+    page.masked.draw()
+    patch.pos = word.pos
+    patch.size = word.size
+    patch.draw()
+    aperture.pos = word.pos
+    aperture.size = word.size
+    aperture.enable()
+    page.full.draw()
+    aperture.disable()
@@ -0,0 +1,188 @@
+import argparse
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from nback import generate_targets, generate_stim_list
+
+
+# === N-BACK DESIGN SIMULATOR ===
+# Usage: python simulate.py --n-back 1 2 3 --targets 2 3 4 --participants 10000
+# Generates sequences with the same code as prepare_test and scores synthetic
+# responders trial by trial. For every design x responder it reports expected
+# accuracy, the d' distribution and floor/ceiling risk.
+# Floor risk: share of simulated participants who do no better than always
+# pressing 'D' (the best strategy without any memory). Ceiling risk: share at
+# or above ceiling_accuracy.
+
+ceiling_accuracy = 0.95
+chunk_size = 2000  # synthetic participants per worker task
+
+# Synthetic responders. p_k: probability of pressing 'K' when guessing.
+# capacity: items held in memory (mean, sd across participants); a responder
+# knows the answer while n_back <= capacity. familiarity: chance that a guess
+# turns into 'K' because the letter was seen recently (lure false alarms).
+# rt_median/rt_sigma: lognormal RT, where a response after stim_duration is a timeout.
+responders = {
+    'guessing': dict(p_k=0.5, capacity=(0, 0), reliability=0, familiarity=0, rt_median=0.7, rt_sigma=0.4),
+    'biased': dict(p_k=0.2, capacity=(0, 0), reliability=0, familiarity=0, rt_median=0.7, rt_sigma=0.4),
+    'capacity_limited': dict(p_k=0.3, capacity=(2.5, 0.8), reliability=0.9, familiarity=0.4, rt_median=0.9, rt_sigma=0.45),
+}
+
+
+# === SEQUENCES ===
+# One row per synthetic participant, letters coded as ints
+def build_sequences(design, n_participants, rng):
+    letters = list(design['letters'])
+    code = {letter: j for j, letter in enumerate(letters)}
+    stims = np.empty((n_participants, design['n_trials']), dtype=np.int8)
+    for p in range(n_participants):
+        sequence = generate_targets(design['n_back'], design['total_blocks'],
+                                    design['trials_per_block'], design['targets_per_block'], rng=rng)
+        stim_list = generate_stim_list(sequence, design['n_back'], letters, rng=rng)
+        stims[p] = [code[letter] for letter in stim_list]
+    return stims
+
+
+# Same rule as nback.is_target, over all participants and trials at once
+def target_matrix(stims, n_back):
+    targets = np.zeros(stims.shape, dtype=bool)
+    targets[:, n_back:] = stims[:, n_back:] == stims[:, :-n_back]
+    return targets
+
+
+def recent_matrix(stims, window):
+    recent = np.zeros(stims.shape, dtype=bool)
+    for lag in range(1, window + 1):
+        recent[:, lag:] |= stims[:, lag:] == stims[:, :-lag]
+    return recent
+
+
+# === RESPONSES & SCORING ===
+# Responses are coded 1 = 'k', 0 = 'd', -1 = no response (timeout)
+def simulate_responses(stims, targets, design, params, rng):
+    n_participants, n_trials = stims.shape
+    n_back = design['n_back']
+
+    capacity = rng.normal(params['capacity'][0], params['capacity'][1], size=(n_participants, 1))
+    p_know = np.clip(capacity - n_back + 1, 0, 1) * params['reliability']
+    knows = rng.random((n_participants, n_trials)) < p_know
+
+    familiar = recent_matrix(stims, n_back + 1) & (rng.random((n_participants, n_trials)) < params['familiarity'])
+    guess_k = familiar | (rng.random((n_participants, n_trials)) < params['p_k'])
+
+    responses = np.where(knows, targets, guess_k).astype(np.int8)
+    rt = rng.lognormal(np.log(params['rt_median'] + 0.1 * n_back), params['rt_sigma'], size=(n_participants, n_trials))
+    responses[rt > design['stim_duration']] = -1
+    return responses
+
+
+# Mirrors nback.score_response: a timeout is never correct
+def score(responses, targets):
+    correct = responses == targets.astype(np.int8)
+    accuracy = correct.mean(axis=1)
+
+    pressed_k = responses == 1
+    n_targets = targets.sum(axis=1)
+    n_nontargets = (~targets).sum(axis=1)
+    # Log-linear correction keeps z finite for perfect or empty rates
+    hit_rate = ((pressed_k & targets).sum(axis=1) + 0.5) / (n_targets + 1)
+    fa_rate = ((pressed_k & ~targets).sum(axis=1) + 0.5) / (n_nontargets + 1)
+    d_prime = norm.ppf(hit_rate) - norm.ppf(fa_rate)
+    return accuracy, d_prime
+
+
+def run_chunk(task):
+    design, responder, n_participants, seed = task
+    rng = np.random.default_rng(seed)
+    stims = build_sequences(design, n_participants, random.Random(seed))
+    targets = target_matrix(stims, design['n_back'])
+    responses = simulate_responses(stims, targets, design, responders[responder], rng)
+    accuracy, d_prime = score(responses, targets)
+    no_memory_accuracy = (~targets).mean(axis=1)
+    return design['design_id'], responder, accuracy, d_prime, no_memory_accuracy
+
+
+# === DESIGNS ===
+def make_designs(n_back_values, total_blocks_values, trials_per_block, targets_values, stim_durations, letter_sets):
+    designs = []
+    for n_back, total_blocks, targets, stim_duration, letters in itertools.product(
+            n_back_values, total_blocks_values, targets_values, stim_durations, letter_sets):
+        designs.append({
+            'design_id': len(designs),
+            'n_back': n_back,
+            'total_blocks': total_blocks,
+            'trials_per_block': trials_per_block,
+            'targets_per_block': targets,
+            'stim_duration': stim_duration,
+            'letters': letters,
+            'n_trials': n_back + total_blocks * trials_per_block,
+        })
+    return designs
+
+
+def simulate(designs, n_participants, seed=0, workers=None):
+    tasks = []
+    seeds = np.random.SeedSequence(seed)
+    for design in designs:
+        for responder in responders:
+            for start in range(0, n_participants, chunk_size):
+                child = seeds.spawn(1)[0].generate_state(1)[0]
+                tasks.append((design, responder, min(chunk_size, n_participants - start), int(child)))
+
+    collected = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for design_id, responder, accuracy, d_prime, no_memory in pool.map(run_chunk, tasks):
+            parts = collected.setdefault((design_id, responder), ([], [], []))
+            parts[0].append(accuracy)
+            parts[1].append(d_prime)
+            parts[2].append(no_memory)
+
+    rows = []
+    for design in designs:
+        for responder in responders:
+            accuracy, d_prime, no_memory = (np.concatenate(part) for part in collected[(design['design_id'], responder)])
+            rows.append({
+                **{key: design[key] for key in ['n_back', 'total_blocks', 'targets_per_block', 'stim_duration', 'letters', 'n_trials']},
+                'responder': responder,
+                'accuracy_mean': accuracy.mean(),
+                'accuracy_sd': accuracy.std(),
+                'no_memory_accuracy': no_memory.mean(),
+                'd_prime_mean': d_prime.mean(),
+                'd_prime_p05': np.percentile(d_prime, 5),
+                'd_prime_p95': np.percentile(d_prime, 95),
+                'floor_risk': (accuracy <= no_memory).mean(),
+                'ceiling_risk': (accuracy >= ceiling_accuracy).mean(),
+            })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of n-back task designs')
+    parser.add_argument('--n-back', type=int, nargs='+', default=[2])
+    parser.add_argument('--blocks', type=int, nargs='+', default=[1])
+    parser.add_argument('--trials-per-block', type=int, default=10)
+    parser.add_argument('--targets', type=int, nargs='+', default=[3])
+    parser.add_argument('--stim-duration', type=float, nargs='+', default=[2.0])
+    parser.add_argument('--letters', nargs='+', default=['CGHKPQTW'])
+    parser.add_argument('--participants', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None, help='optional CSV path for the report')
+    args = parser.parse_args()
+
+    designs = make_designs(args.n_back, args.blocks, args.trials_per_block, args.targets, args.stim_duration, args.letters)
+    report = simulate(designs, args.participants, seed=args.seed, workers=args.workers)
+    if args.out:
+        report.to_csv(args.out, index=False)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report.round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import pytest
+
+from calibration import correct_rt, frame_locked, frames_for, match_presses
+
+
+# PTB GetSecs() counts from boot; event.getKeys from when PsychoPy was imported
+boot_seconds = 86400.0
+import_time = boot_seconds - 12.5
+press_times = [boot_seconds + 0.8 * i for i in range(5)]
+lag = 0.012
+
+
+def polled_from(presses):
+    return [t + lag - import_time for t in presses]
+
+
+def test_match_presses_on_realistic_clocks():
+    lags = match_presses(polled_from(press_times), press_times, polled_zero=import_time)
+    assert lags == pytest.approx([lag] * 5)
+
+
+def test_match_presses_needs_a_common_clock():
+    assert match_presses(polled_from(press_times), press_times) == []
+
+
+def test_press_missing_from_one_queue_does_not_shift_pairs():
+    polled = polled_from(press_times[:2] + press_times[3:])
+    hardware = press_times[:4]
+    lags = match_presses(polled, hardware, polled_zero=import_time)
+    assert lags == pytest.approx([lag] * 3)
+
+
+
+def test_frames_for_uses_profile_then_fallback_interval():
+    profile = {'frame_interval_median': 1 / 144}
+    assert frames_for(1.0, profile) == 144
+    assert frames_for(1.0, profile, fallback_interval=1 / 60) == 144
+    assert frames_for(1.0, None, fallback_interval=1 / 120) == 120
+    assert frame_locked(2.0, None, fallback_interval=1 / 120) == pytest.approx(2.0)
+
+
+def test_no_frame_interval_means_timed_waits():
+    assert frames_for(1.0, None) is None
+    assert frame_locked(2.0, None) == 2.0
+
+
+def test_correct_rt_applies_only_measured_latencies():
+    profile = {'input_latency': 0.010, 'input_latency_method': 'ptb_keyboard',
+               'audio_latency': 0.030, 'audio_latency_method': 'ptb_predicted_latency'}
+    assert correct_rt(0.5, profile, audio=True) == pytest.approx(0.46)
+
+    unmeasured = dict(profile, input_latency_method='not_measured', audio_latency_method='play_call_duration')
+    assert correct_rt(0.5, unmeasured, audio=True) == 0.5
+    assert correct_rt(None, profile) is None
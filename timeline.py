@@ -0,0 +1,76 @@
+import json
+import time
+from collections import namedtuple
+
+import psutil
+
+
+# === DECLARATIVE SESSION TIMELINE ===
+# A timeline file (YAML, or JSON for .json paths) lists the session's phases
+# in order. compile_timeline() calls the builder registered for each phase
+# type. The builder does all construction for that phase (stimuli, sounds,
+# data stores) and returns run(inputs), which only presents the phase.
+# The result is a SessionGraph: phases in running order, with data edges from
+# each phase to its `sources` (earlier phases whose outputs it receives).
+# Walking the graph then does no construction work between phases.
+#
+# Each phase's build time and the change in process resident memory (RSS)
+# are measured around its single build. RSS includes memory the graphics and
+# audio drivers map into the process (psutil is a PsychoPy dependency).
+
+Phase = namedtuple('Phase', ['id', 'type', 'sources', 'run', 'prep_seconds', 'prep_bytes'])
+
+
+def load_timeline(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        import yaml
+        return yaml.safe_load(f)
+
+
+class SessionGraph:
+    def __init__(self, phases):
+        self.phases = phases
+
+    def report(self):
+        lines = [f"{'phase':<24}{'type':<18}{'prep ms':>10}{'RSS KiB':>10}"]
+        for phase in self.phases:
+            lines.append(f"{phase.id:<24}{phase.type:<18}{phase.prep_seconds * 1000:>10.1f}{phase.prep_bytes / 1024:>10.1f}")
+        total_seconds = sum(phase.prep_seconds for phase in self.phases)
+        total_bytes = sum(phase.prep_bytes for phase in self.phases)
+        lines.append(f"{'total':<42}{total_seconds * 1000:>10.1f}{total_bytes / 1024:>10.1f}")
+        return lines
+
+    # Returns every phase's output, keyed by phase id
+    def run(self):
+        outputs = {}
+        for phase in self.phases:
+            outputs[phase.id] = phase.run([outputs[source] for source in phase.sources])
+        return outputs
+
+
+def compile_timeline(spec, builders):
+    process = psutil.Process()
+    phases = []
+    seen = set()
+    for entry in spec['phases']:
+        phase_id, phase_type = entry['id'], entry['type']
+        if phase_id in seen:
+            raise ValueError(f"Duplicate phase id {phase_id!r}")
+        if phase_type not in builders:
+            raise ValueError(f"Phase {phase_id!r} has unknown type {phase_type!r}")
+        sources = tuple(entry.get('sources', ()))
+        for source in sources:
+            if source not in seen:
+                raise ValueError(f"Phase {phase_id!r} reads from {source!r}, which is not an earlier phase")
+
+        rss_before = process.memory_info().rss
+        start = time.perf_counter()
+        run = builders[phase_type](entry)
+        prep_seconds = time.perf_counter() - start
+        prep_bytes = process.memory_info().rss - rss_before
+
+        phases.append(Phase(phase_id, phase_type, sources, run, prep_seconds, prep_bytes))
+        seen.add(phase_id)
+    return SessionGraph(phases)